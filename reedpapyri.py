@@ -1,53 +1,61 @@
+import contextlib
 import io
+import itertools
 import json
 import os
+import pickle
 import re
 import shutil
-import sqlite3
 import struct
-import subprocess
 import sys
 import textwrap
-import zipfile
+import time
 import hashlib
 import zlib
+import functools
 from dataclasses import dataclass
-from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Union, Optional
-from xml.etree.ElementTree import Element, SubElement, ElementTree
-import platform
-import tempfile
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Union, Optional
 
-import yaml
+__version__ = "0.1"
 
 
-OPEN_SYNTAXHIGHLIGHT_EMITSENTINEL = "<syntaxhighlight lang=\"papyrus\">"
-CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL= "</syntaxhighlight>"
+class SyntaxHighlightTags(NamedTuple):
+    """Opening and closing <syntaxhighlight> tags wrapped around emitted Papyrus code."""
+    open_tag: str
+    close_tag: str
 
-def remap_syntaxhighlight(language: str):
-    global OPEN_SYNTAXHIGHLIGHT_EMITSENTINEL
-    global CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL
-    
+
+@functools.lru_cache(maxsize=None)
+def syntax_tags(language: str) -> SyntaxHighlightTags:
+    """Return the (cached) highlight tags for a --syntax-language value."""
     # Handle special inputs: NORMAL and FALLBACK
     if language.upper() == "NORMAL":
-        OPEN_SYNTAXHIGHLIGHT_EMITSENTINEL = "<syntaxhighlight lang=\"papyrus\">"
-        CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL = "</syntaxhighlight>"
+        lang = "papyrus"
     elif language.upper() == "FALLBACK":
-        OPEN_SYNTAXHIGHLIGHT_EMITSENTINEL = "<syntaxhighlight lang=\"AutoIt\">"
-        CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL = "</syntaxhighlight>"
+        lang = "AutoIt"
     else:
         # For any other language, apply its own syntax highlighting
-        OPEN_SYNTAXHIGHLIGHT_EMITSENTINEL = f"<syntaxhighlight lang=\"{language.lower()}\">"
-        CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL = "</syntaxhighlight>"
+        lang = language.lower()
+    return SyntaxHighlightTags(f"<syntaxhighlight lang=\"{lang}\">", "</syntaxhighlight>")
+
+
+# Tags read by the emitters; remapping swaps the whole immutable pair at once
+SYNTAX_TAGS = syntax_tags("NORMAL")
 
-    # Return the updated semiglobally defined tags
-    return OPEN_SYNTAXHIGHLIGHT_EMITSENTINEL, CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL
+def remap_syntaxhighlight(language: str) -> SyntaxHighlightTags:
+    global SYNTAX_TAGS
+    SYNTAX_TAGS = syntax_tags(language)
+    return SYNTAX_TAGS
 
 
 
 
-@dataclass
+# dataclass(slots=True) only exists on Python 3.10+
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(frozen=True, **_DATACLASS_SLOTS)
 class SyntaxHighlightConfig:
     """Config for MediaWiki syntax highlighting extension and Papyrus lexer."""
     extension: str = "SyntaxHighlight_GeSHi"
@@ -64,22 +72,15 @@ from pathlib import Path
 import textwrap
 
 
-class PapyrusLexerInjectorGenerator:
-    """
-    Generates a fully functional, self-contained Papyrus lexer injector script
-    (equivalent to papyruslexerconjecture.py) for MediaWiki's SyntaxHighlight_GeSHi.
-    """
-
-    def __init__(self, output_path: str = "papyruslexerconjecture.py"):
-        self.output_path = Path(output_path)
-
-    def generate_code(self) -> str:
-        """Return the complete injector script source as a string."""
-        return textwrap.dedent(r"""\
+# Injector script source, dedented and encoded once at import (it never varies per call)
+_INJECTOR_SRC = textwrap.dedent(r"""\
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import hashlib
 import os
+import re
+import socket
 import sys
 import zipfile
 import subprocess
@@ -87,16 +88,21 @@ import textwrap
 import time
 import threading
 import tempfile
-import shutil
 from pathlib import Path
 
 PYGMENTIZE_BUNDLE = "/var/www/html/extensions/SyntaxHighlight_GeSHi/pygments/pygmentize"
 UPDATE_LEXERS = "/var/www/html/extensions/SyntaxHighlight_GeSHi/maintenance/updateLexerList.php"
 UPDATE_CSS = "/var/www/html/extensions/SyntaxHighlight_GeSHi/maintenance/updateCSS.php"
+# Background re-registration waits for Apache to accept connections, at most this many seconds
+MW_READY_TIMEOUT = 20
+# sha256 of the last bundle that passed verify_bundle()
+VERIFIED_DIGEST = PYGMENTIZE_BUNDLE + ".sha256"
 
 LEXER_CODE = textwrap.dedent(r'''\
 
-from pygments.lexer import RegexLexer, bygroups
+import re
+
+from pygments.lexer import RegexLexer, bygroups, words
 from pygments.token import Text, Comment, Keyword, Name, String, Number, Operator, Punctuation
 
 __all__ = ["PapyrusLexer"]
@@ -107,6 +113,10 @@ class PapyrusLexer(RegexLexer):
     filenames = ["*.psc"]
     mimetypes = ["text/x-papyrus"]
 
+    # Papyrus is case-insensitive throughout, so one lexer-wide flag replaces per-rule (?i);
+    # MULTILINE is RegexLexer's default and keeps `$` ending line comments
+    flags = re.IGNORECASE | re.MULTILINE
+
     tokens = {
         "root": [
 
@@ -114,23 +124,24 @@ class PapyrusLexer(RegexLexer):
             (r";.*?$", Comment.Single),
             (r"/;.*?;/", Comment.Multiline),
 
-            (
-                r'(?i)\b(scriptname|extends|import|property|endproperty|auto|const|'
-                r'function|endfunction|event|endevent|state|endstate|struct|endstruct|'
-                r'if|elseif|else|endif|while|endwhile|return|new|as)\b',
-                Keyword
-            ),
-              
-            (r'(?i)\b(None|True|False)\b', Keyword.Constant),
+            # words() folds each list into one prefix-factored alternation
+            (words((
+                "scriptname", "extends", "import", "property", "endproperty", "auto", "const",
+                "function", "endfunction", "event", "endevent", "state", "endstate", "struct", "endstruct",
+                "if", "elseif", "else", "endif", "while", "endwhile", "return", "new", "as",
+            ), prefix=r"\b", suffix=r"\b"), Keyword),
+
+            (words(("None", "True", "False"), prefix=r"\b", suffix=r"\b"), Keyword.Constant),
 
-            (r'(?i)\b(ObjectReference|Actor|Quest|Alias|Form|Armor|Weapon|Race|'
-             r'MagicEffect|Activator|Sound|Static|GlobalVariable|ImageSpaceModifier)\b',
-             Name.Builtin),
+            (words((
+                "ObjectReference", "Actor", "Quest", "Alias", "Form", "Armor", "Weapon", "Race",
+                "MagicEffect", "Activator", "Sound", "Static", "GlobalVariable", "ImageSpaceModifier",
+            ), prefix=r"\b", suffix=r"\b"), Name.Builtin),
 
             (r"\b\d+\.\d+\b", Number.Float),
             (r"\b\d+\b", Number.Integer),
 
-            (r'"([^"\\]|\\.)*"', String),
+            (r'"(?:[^"\\]|\\.)*"', String),
 
             (r'==|!=|<=|>=|[-+/*%=<>!]', Operator),
             (r'[()\[\]{},.:]', Punctuation),
@@ -173,67 +184,102 @@ MAPPING_INSERTION = (
     "('papyrus', 'psc'), ('*.psc',), ('text/x-papyrus',)),\n"
 )
 
+# The whole AutoItLexer mapping line, so the Papyrus entry can be inserted right after it
+AUTOIT_ENTRY_RE = re.compile(r"^([^\n]*'AutoItLexer':[^\n]*\n)", re.M)
+
 def ensure_bundle_exists():
     if not os.path.exists(PYGMENTIZE_BUNDLE):
         sys.exit(f"[❌] Cannot find pygmentize bundle at {PYGMENTIZE_BUNDLE}")
     print(f"[✔] Found existing pygmentize bundle.")
 
+LEXER_MEMBER = "pygments/lexers/papyrus.py"
+STYLE_MEMBER = "pygments/styles/papyrus.py"
+MAPPING_MEMBER = "pygments/lexers/_mapping.py"
+
+# Rewrite the bundle in a single pass, replacing or adding the members in `mutations`.
+# The shebang is written ahead of the archive (zip readers ignore leading bytes), so the
+# result is already a runnable zipapp and needs no separate repack. `zin` is the bundle
+# main() already opened, so its central directory is parsed only once per run.
+def rebuild_bundle(zin, mutations):
+    print("[⚙️] Rebuilding pygmentize bundle as a self-contained zipapp...")
+    bundle_dir = os.path.dirname(PYGMENTIZE_BUNDLE)
+    fd, tmp = tempfile.mkstemp(prefix="pyg_patch_", dir=bundle_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(b"#!/usr/bin/env python3\n")
+            with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zout:
+                pending = dict(mutations)
+                for zi in zin.infolist():
+                    if zi.filename in pending:
+                        zout.writestr(zi.filename, pending.pop(zi.filename))
+                    else:
+                        # Members keep their own compress_type, so stored entries are copied as-is
+                        zout.writestr(zi, zin.read(zi))
+                for name, data in pending.items():
+                    zout.writestr(name, data)
+        os.chmod(tmp, 0o755)
+        os.replace(tmp, PYGMENTIZE_BUNDLE)
+    except Exception as e:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        print(f"[❌] Failed to rebuild pygmentize zipapp: {e}")
+        sys.exit(1)
+    print("[✅] Bundle rebuilt and executable restored.")
+
+def has_member(zf, name):
+    # Central directory lookup; avoids building the full namelist
+    try:
+        zf.getinfo(name)
+        return True
+    except KeyError:
+        return False
+
 def inject_files():
     print("[🧩] Injecting Papyrus lexer and style into Pygments bundle...")
-    tmp = tempfile.mkdtemp(prefix="pyg_patch_")
-    with zipfile.ZipFile(PYGMENTIZE_BUNDLE, "r") as zf:
-        zf.extractall(tmp)
-
-    Path(tmp, "pygments/lexers/papyrus.py").write_text(LEXER_CODE, encoding="utf-8")
-    Path(tmp, "pygments/styles/papyrus.py").write_text(STYLE_CODE, encoding="utf-8")
-
-    with zipfile.ZipFile(PYGMENTIZE_BUNDLE, "w", zipfile.ZIP_DEFLATED) as zf:
-        for root, _, files in os.walk(tmp):
-            for f in files:
-                fp = os.path.join(root, f)
-                rel = os.path.relpath(fp, tmp)
-                zf.write(fp, rel)
-    shutil.rmtree(tmp)
     print("   → Added pygments/lexers/papyrus.py")
     print("   → Added pygments/styles/papyrus.py")
+    return {
+        LEXER_MEMBER: LEXER_CODE.encode("utf-8"),
+        STYLE_MEMBER: STYLE_CODE.encode("utf-8"),
+    }
 
-def patch_mapping():
+def patch_mapping(zf):
     print("[🧬] Patching pygments/lexers/_mapping.py to add PapyrusLexer after AutoItLexer...")
-    autoit_key = "'AutoItLexer':"
-    tmp = tempfile.mkdtemp(prefix="pyg_patch_")
     try:
-        with zipfile.ZipFile(PYGMENTIZE_BUNDLE, "r") as zf:
-            zf.extractall(tmp)
-        mapping_path = Path(tmp, "pygments/lexers/_mapping.py")
-        data = mapping_path.read_text(encoding="utf-8")
+        data = zf.read(MAPPING_MEMBER).decode("utf-8")
         if "PapyrusLexer" in data:
             print("[ℹ️] PapyrusLexer already present; skipping patch.")
-        else:
-            if autoit_key not in data:
-                print("[⚠️] AutoItLexer entry not found — inserting at end instead.")
-                new_data = data.rstrip() + "\n" + MAPPING_INSERTION + "\n"
-            else:
-                lines = data.splitlines(keepends=True)
-                new_lines = []
-                for line in lines:
-                    new_lines.append(line)
-                    if autoit_key in line:
-                        new_lines.append(MAPPING_INSERTION)
-                new_data = "".join(new_lines)
-            mapping_path.write_text(new_data, encoding="utf-8")
-
-        # rebuild the bundle cleanly
-        with zipfile.ZipFile(PYGMENTIZE_BUNDLE, "w", zipfile.ZIP_DEFLATED) as zf:
-            for root, _, files in os.walk(tmp):
-                for f in files:
-                    fp = os.path.join(root, f)
-                    rel = os.path.relpath(fp, tmp)
-                    zf.write(fp, rel)
+            return None
+        new_data, found = AUTOIT_ENTRY_RE.subn(lambda m: m.group(1) + MAPPING_INSERTION, data, count=1)
+        if not found:
+            print("[⚠️] AutoItLexer entry not found — inserting at end instead.")
+            new_data = data.rstrip() + "\n" + MAPPING_INSERTION + "\n"
         print("[✅] Successfully added PapyrusLexer to _mapping.py.")
+        return new_data.encode("utf-8")
     except Exception as e:
         print(f"[❌] Failed to patch mapping: {e}")
-    finally:
-        shutil.rmtree(tmp)
+        return None
+
+def bundle_digest():
+    with open(PYGMENTIZE_BUNDLE, "rb") as f:
+        if hasattr(hashlib, "file_digest"):  # Python 3.11+
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+        return h.hexdigest()
+
+def verify_bundle_if_changed():
+    # Spawning pygments to verify is the slow part, so skip it for an already-verified bundle
+    digest = bundle_digest()
+    try:
+        if Path(VERIFIED_DIGEST).read_text(encoding="utf-8").strip() == digest:
+            print("[✅] Pygments bundle unchanged since last verification.")
+            return
+    except OSError:
+        pass
+    verify_bundle()
+    Path(VERIFIED_DIGEST).write_text(digest + "\n", encoding="utf-8")
 
 def verify_bundle():
     print("[🔎] Verifying Pygments bundle integrity...")
@@ -241,11 +287,14 @@ def verify_bundle():
     # Tell Python to import from the MediaWiki pygmentize zip first (this isn't system installed!)
     env["PYTHONPATH"] = f"/var/www/html/extensions/SyntaxHighlight_GeSHi/pygments/pygmentize:{env.get('PYTHONPATH', '')}"
     try:
+        # Success is the exit status; the lexer listing itself is not needed, so it is
+        # discarded by the OS instead of being buffered here
         subprocess.run(
             ["python3", "-m", "pygments", "-L", "lexers"],
             env=env,
             check=True,
-            capture_output=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
         )
         print("[✅] Pygments bundle verified successfully.")
     except subprocess.CalledProcessError as e:
@@ -253,33 +302,6 @@ def verify_bundle():
         print(e.stderr.decode(errors="ignore"))
         sys.exit(1)
 
-def reapp_bundle():
-    print("[⚙️] Rebuilding pygmentize bundle as a self-contained zipapp...")
-
-    import zipapp
-
-    tmp = tempfile.mkdtemp(prefix="pyg_repack_")
-    try:
-        # Extract current bundle to temp
-        with zipfile.ZipFile(PYGMENTIZE_BUNDLE, "r") as zf:
-            zf.extractall(tmp)
-
-        # Rebuild using zipapp to add a proper shebang
-        zipapp.create_archive(
-            source=tmp,
-            target=PYGMENTIZE_BUNDLE,
-            interpreter="/usr/bin/env python3"
-        )
-        os.chmod(PYGMENTIZE_BUNDLE, 0o755)
-
-        print("[✅] Bundle rebuilt and executable restored.")
-    except Exception as e:
-        print(f"[❌] Failed to rebuild pygmentize zipapp: {e}")
-        sys.exit(1)
-    finally:
-        shutil.rmtree(tmp, ignore_errors=True)
-
-
 def test_highlight_papyrus():
 
     sample_path = "/var/www/html/extensions/SyntaxHighlight_GeSHi/Example.psc"
@@ -307,53 +329,83 @@ EndFunction
 
     Path(sample_path).write_text(sample_code, encoding="utf-8")
     print(f"[🧪] Testing Papyrus highlighting → {sample_path}")
-    subprocess.run(
-        [
-            "python3",
-            "/var/www/html/extensions/SyntaxHighlight_GeSHi/pygments/pygmentize",
-            "-l", "papyrus",
-            "-f", "terminal256",
-            "-O", "style=papyrus",
-            sample_path,
-        ],
-        check=False,
-    )
-    subprocess.run(["python3","/var/www/html/extensions/SyntaxHighlight_GeSHi/pygments/pygmentize","-l", "autoit","-f", "terminal256", "-O", "style=default", sample_path],check=False)
-   
+    # Both renders run side by side; output is collected so the two listings don't interleave
+    procs = [
+        subprocess.Popen(
+            [
+                "python3",
+                "/var/www/html/extensions/SyntaxHighlight_GeSHi/pygments/pygmentize",
+                "-l", "papyrus",
+                "-f", "terminal256",
+                "-O", "style=papyrus",
+                sample_path,
+            ],
+            stdout=subprocess.PIPE,
+        ),
+        subprocess.Popen(["python3","/var/www/html/extensions/SyntaxHighlight_GeSHi/pygments/pygmentize","-l", "autoit","-f", "terminal256", "-O", "style=default", sample_path], stdout=subprocess.PIPE),
+    ]
+    sys.stdout.flush()
+    for proc in procs:
+        out, _ = proc.communicate()
+        sys.stdout.buffer.write(out)
+    sys.stdout.flush()
+
     print("[✅] Papyrus highlighting test completed.\n")
 
 def regenerate_mediawiki_data():
     print("[🧠] Triggering MediaWiki SyntaxHighlight regeneration...")
-    subprocess.run(["php", UPDATE_LEXERS], check=False)
     env = os.environ.copy()
     env["PYGMENTS_STYLE"] = "papyrus"
-    subprocess.run(["php", UPDATE_CSS], check=False, env=env)
+    # The lexer list and the CSS are independent, so let both PHP boots overlap
+    procs = [
+        subprocess.Popen(["php", UPDATE_LEXERS]),
+        subprocess.Popen(["php", UPDATE_CSS], env=env),
+    ]
+    for proc in procs:
+        proc.wait()
     print("[✅] MediaWiki SyntaxHighlight lexers and CSS refreshed.")
 
+def wait_for_mediawiki():
+    deadline = time.monotonic() + MW_READY_TIMEOUT
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", 80)) == 0:
+                return True
+        time.sleep(0.25)
+    return False
+
 def delayed_regeneration():
-    print("[⏱] Waiting 20 seconds before background re-registration...")
+    print(f"[⏱] Waiting up to {MW_READY_TIMEOUT} seconds for MediaWiki before background re-registration...")
     sys.stdout.flush()
-    time.sleep(20)
+    if not wait_for_mediawiki():
+        print("[⚠️] MediaWiki not reachable yet; re-registering anyway.")
     regenerate_mediawiki_data()
     print("[✅] Background MediaWiki regeneration complete.")
 
 def main():
     ensure_bundle_exists()
     print("[🔍] Checking if Papyrus already injected...")
+    mutations = {}
     with zipfile.ZipFile(PYGMENTIZE_BUNDLE, "r") as zf:
-        names = zf.namelist()
-    if "pygments/lexers/papyrus.py" in names:
-        print("[ℹ️] Papyrus lexer already in bundle — patching mapping and regenerating only.")
-    else:
-        inject_files()
-    patch_mapping()
-    verify_bundle()
-    reapp_bundle()
+        if has_member(zf, LEXER_MEMBER):
+            print("[ℹ️] Papyrus lexer already in bundle — patching mapping and regenerating only.")
+        else:
+            mutations.update(inject_files())
+        mapping = patch_mapping(zf)
+        if mapping is not None:
+            mutations[MAPPING_MEMBER] = mapping
+        # One rewrite covers the injected files and the mapping patch together
+        if mutations:
+            rebuild_bundle(zf, mutations)
+        else:
+            print("[ℹ️] Bundle already patched; leaving it untouched.")
+    verify_bundle_if_changed()
     regenerate_mediawiki_data()
     test_highlight_papyrus()
 
     try:
-        threading.Thread(target=delayed_regeneration, daemon=True).start()
+        # Not a daemon: the launcher backgrounds this script, so it can outlive main() until the re-run is done
+        threading.Thread(target=delayed_regeneration).start()
         print("[🚀] Scheduled background regeneration.")
     except Exception as e:
         print(f"[⚠️] Could not start delayed regeneration: {e}")
@@ -361,16 +413,58 @@ def main():
 if __name__ == "__main__":
     main()
 """).lstrip()
+_INJECTOR_SRC_BYTES = _INJECTOR_SRC.encode("utf-8")
+
+
+def write_file_bytes(path, data: bytes, mode: int = 0o666):
+    """Write pre-encoded bytes with raw os.write calls, skipping the buffered/text file object layers."""
+    # O_BINARY keeps Windows from translating newlines on the raw descriptor
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), mode)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path, data: bytes, mode: int = 0o644):
+    """Write pre-encoded bytes to a sibling temp file with raw os.write calls, then os.replace it into place."""
+    path = os.fspath(path)
+    tmp_path = path + ".tmp"
+    write_file_bytes(tmp_path, data, mode)
+    os.replace(tmp_path, path)
+
+
+class PapyrusLexerInjectorGenerator:
+    """
+    Generates a fully functional, self-contained Papyrus lexer injector script
+    (equivalent to papyruslexerconjecture.py) for MediaWiki's SyntaxHighlight_GeSHi.
+    """
+
+    def __init__(self, output_path: str = "papyruslexerconjecture.py"):
+        self.output_path = Path(output_path)
+
+    def generate_code(self) -> str:
+        """Return the complete injector script source as a string."""
+        return _INJECTOR_SRC
 
     def write(self):
         """Write the generated script to disk."""
-        code = self.generate_code()
-        self.output_path.write_text(code, encoding="utf-8")
+        atomic_write_bytes(self.output_path, _INJECTOR_SRC_BYTES, 0o755)
         os.chmod(self.output_path, 0o755)
         print(f"🧬 Generated Papyrus lexer injector → {self.output_path}")
 
 
 
+# IEND is always empty, so its whole chunk (length, tag, CRC) is a constant
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_IEND_CHUNK = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+# Every chunk CRC starts with its type tag, so seed the running CRC with these
+_CRC_IHDR = zlib.crc32(b"IHDR")
+_CRC_IDAT = zlib.crc32(b"IDAT")
+
+
 def ensure_dummy_png(path: str, color=(255, 255, 255, 255), size=(160, 160)):
     """
     Generate a valid PNG using only the Python standard library.
@@ -383,35 +477,43 @@ def ensure_dummy_png(path: str, color=(255, 255, 255, 255), size=(160, 160)):
         return
 
     width, height = size
-    png_sig = b"\x89PNG\r\n\x1a\n"
 
     # IHDR: image header chunk
     ihdr_data = struct.pack("!2I5B", width, height, 8, 6, 0, 0, 0)
-    ihdr = b"IHDR" + ihdr_data
-    ihdr_crc = struct.pack("!I", zlib.crc32(ihdr) & 0xffffffff)
-    ihdr_chunk = struct.pack("!I", len(ihdr_data)) + ihdr + ihdr_crc
+    ihdr_crc = struct.pack("!I", zlib.crc32(ihdr_data, _CRC_IHDR) & 0xffffffff)
+    ihdr_chunk = struct.pack("!I", len(ihdr_data)) + b"IHDR" + ihdr_data + ihdr_crc
 
-    # Build raw image data: each scanline starts with filter byte 0
+    # Build raw image data: each scanline starts with filter byte 0.
+    # Scanlines are streamed into the compressor rather than materialized as one buffer.
     pixel = bytes(color)
     row = b"\x00" + pixel * width
-    raw_image = row * height
-    compressed = zlib.compress(raw_image)
-
-    # IDAT: image data chunk
-    idat = b"IDAT" + compressed
-    idat_crc = struct.pack("!I", zlib.crc32(idat) & 0xffffffff)
-    idat_chunk = struct.pack("!I", len(compressed)) + idat + idat_crc
-
-    # IEND: image end chunk
-    iend = b"IEND"
-    iend_crc = struct.pack("!I", zlib.crc32(iend) & 0xffffffff)
-    iend_chunk = struct.pack("!I", 0) + iend + iend_crc
+    co = zlib.compressobj()
+    compressed_parts = [co.compress(row) for _ in range(height)]
+    compressed_parts.append(co.flush())
+
+    # IDAT: image data chunk, CRC accumulated over the compressed parts
+    idat_crc = _CRC_IDAT
+    compressed_len = 0
+    for part in compressed_parts:
+        idat_crc = zlib.crc32(part, idat_crc)
+        compressed_len += len(part)
+    idat_chunk = b"".join([
+        struct.pack("!I", compressed_len),
+        b"IDAT",
+        *compressed_parts,
+        struct.pack("!I", idat_crc & 0xffffffff),
+    ])
 
     # Combine all
-    png_data = png_sig + ihdr_chunk + idat_chunk + iend_chunk
+    png_data = _PNG_SIGNATURE + ihdr_chunk + idat_chunk + _PNG_IEND_CHUNK
     path.write_bytes(png_data)
     print(f"🖼️ Generated dummy {width}x{height} PNG at {path}")
 
+# Shared, immutable defaults so each compose generator doesn't allocate its own copies
+_DEFAULT_PHP_MODULES = ("memory_limit=1024M", "max_execution_time=0")
+_DEFAULT_SKINS = ("vector",)
+_DEFAULT_SYNTAX_CONFIG = SyntaxHighlightConfig()
+
 class PapyrusDockerComposeUnattendedSQLDatabaseVersion:
     """
     Generates a docker-compose.yml for an unattended MediaWiki + MariaDB deployment,
@@ -421,6 +523,177 @@ class PapyrusDockerComposeUnattendedSQLDatabaseVersion:
     with parameterized SQL backend, ports, syntax highlight extension, and more.
     """
 
+    __slots__ = (
+        "output_dir",
+        "project_name",
+        "db_image",
+        "mw_image",
+        "mw_http_port",
+        "db_port",
+        "mw_dbname",
+        "mw_dbuser",
+        "mw_dbpass",
+        "mw_rootpass",
+        "mw_admin_user",
+        "mw_admin_pass",
+        "mw_site_name",
+        "mw_site_lang",
+        "mw_server",
+        "mw_extensions",
+        "mw_skins",
+        "enable_autoimport",
+        "autoimport_marker",
+        "syntax_config",
+        "python_injector_script",
+        "injector_mount_path",
+        "wiki_logo_path",
+        "auto_import_xml",
+        "docker_volume_name",
+        "php_modules",
+        "sleep_time",
+        "bind_images_dir",
+        "docker_compose_version",
+        "verbose",
+        "email",
+        "install_syntax_highlighting",
+        "enable_ssl",
+    )
+
+    # Compose body, dedented once at class load; generate() only fills in the fields.
+    # Multi-line fields are pre-indented to their final column by the helpers below.
+    COMPOSE_TEMPLATE = textwrap.dedent("""
+
+        services:
+          papyrusproj_{self.project_name}_mediawiki_unattended_db:
+            image: {self.db_image}
+            restart: always
+            environment:
+              MYSQL_DATABASE: {self.mw_dbname}
+              MYSQL_USER: {self.mw_dbuser}
+              MYSQL_PASSWORD: {self.mw_dbpass}
+              MYSQL_ROOT_PASSWORD: {self.mw_rootpass}
+            volumes:
+              - {self.docker_volume_name}:/var/lib/mysql
+            ports:
+              - "{self.db_port}:3306"
+
+          papyrusproj_{self.project_name}_mediawiki_unattended_wikiserver:
+            image: {self.mw_image}
+            restart: always
+            ports:
+              - "{self.mw_http_port}:80"
+            environment:
+              MW_DBTYPE: mysql
+              MW_DBHOST: mediawiki_unattended_db
+              MW_DBNAME: {self.mw_dbname}
+              MW_DBUSER: {self.mw_dbuser}
+              MW_DBPASS: {self.mw_dbpass}
+              MW_SITE_NAME: "{self.mw_site_name}"
+              MW_SITE_LANG: {self.mw_site_lang}
+              MW_SERVER: "{transport}{self.mw_server}"
+              MW_ADMIN_USER: {self.mw_admin_user}
+              MW_ADMIN_PASS: {self.mw_admin_pass}
+            volumes:
+            {images_mount}
+              - {self.python_injector_script}:{self.injector_mount_path}
+              - {self.wiki_logo_path}:/var/www/html/resources/assets/wiki_custom_logo.png
+              - {auto_run_xml}:/var/www/html/AutoFirstRunImport.xml
+            command: |
+              /bin/bash -c '
+                echo "⏳ Waiting {self.sleep_time} seconds for MariaDB to settle...";
+                sleep {self.sleep_time};
+                echo "🧠 Configuring PHP settings...";
+                {php_conf}
+
+                if [ ! -f /var/www/html/LocalSettings.php ]; then
+                  echo "⚙️ Running unattended MediaWiki installation...";
+                  php maintenance/run.php install \\
+                    --dbname={self.mw_dbname} \\
+                    --dbtype=mysql \\
+                    --dbserver=papyrusproj_{self.project_name}_mediawiki_unattended_db \\
+                    --dbport=3306 \\
+                    --dbuser={self.mw_dbuser} \\
+                    --dbpass={self.mw_dbpass} \\
+                    --installdbuser={self.mw_dbuser} \\
+                    --installdbpass={self.mw_dbpass} \\
+                    --server={transport}{self.mw_server} \\
+                    --scriptpath="" \\
+                    --lang={self.mw_site_lang} \\
+                    --pass={self.mw_admin_pass} \\
+                    "{self.mw_site_name}" {self.mw_admin_user};
+
+        {injector_launch}
+
+                  echo "🔌 Enabling {self.syntax_config.extension}...";
+                  {ext_loads}
+
+                  echo "🎨 Configuring logo...";
+                  {logo_conf}
+
+                  echo "🎨 Applying default skin...";
+                  {skin_conf}
+
+                  echo "Contemplating auto import";
+                  if [ -s /var/www/html/AutoFirstRunImport.xml ] && [ {autoimport_enabled} = true ]; then
+                    echo "📦 Found AutoFirstRunImport.xml — beginning import...";
+                    php maintenance/importDump.php --conf /var/www/html/LocalSettings.php --username-prefix="" /var/www/html/AutoFirstRunImport.xml;
+                    echo "🔁 Rebuilding site statistics...";
+                    php maintenance/initSiteStats.php --update;
+                    touch {self.autoimport_marker}
+                  else
+                    echo "🕳️ Auto import disabled or no file found.";
+                  fi;
+        {injector_rereg}
+                else
+                  echo "✅ LocalSettings.php already exists — skipping installation.";
+                fi;
+                exec apache2-foreground
+              '
+
+        volumes:
+          {self.docker_volume_name}:
+        """).rstrip() + "\n"
+
+    # Background lexer injection step, only emitted with install_syntax_highlighting
+    INJECTOR_LAUNCH_TEMPLATE = (
+        '          echo "{message}";\n'
+        '          python3 {path}{extra_args} &'
+    )
+
+    # SSL addendum pieces, dedented once at class load like COMPOSE_TEMPLATE
+    CADDY_SERVICE_TEMPLATE = textwrap.dedent("""
+        papyrusproj_{project}_caddy:
+            image: caddy:2
+            restart: always
+            depends_on:
+            - papyrusproj_{project}_mediawiki_unattended_wikiserver
+            ports:
+            - "80:80"
+            - "443:443"
+            volumes:
+            - ./Caddyfile:/etc/caddy/Caddyfile
+            - caddy_data:/data
+            - caddy_config:/config
+        """).rstrip()
+
+    CADDY_VOLUMES = textwrap.dedent("""
+
+        caddy_data:
+        caddy_config:
+        """)
+
+    CADDYFILE_TEMPLATE = textwrap.dedent("""\
+        :80 {{
+            redir https://{{{{host}}}}:443{{{{uri}}}}
+        }}
+
+        :443 {{
+            {tls_line}
+            reverse_proxy papyrusproj_{project}_mediawiki_unattended_wikiserver:80
+        }}
+        """)
+
+
     def __init__(
         self,
         output_dir: str,
@@ -474,20 +747,17 @@ class PapyrusDockerComposeUnattendedSQLDatabaseVersion:
         self.mw_site_name = mw_site_name
         self.mw_site_lang = mw_site_lang
         self.mw_server = mw_server
-        self.mw_extensions = mw_extensions or []
-        self.mw_skins = mw_skins or ["vector"]
+        self.mw_extensions = tuple(mw_extensions) if mw_extensions else ()
+        self.mw_skins = tuple(mw_skins) if mw_skins else _DEFAULT_SKINS
         self.enable_autoimport = enable_autoimport
         self.autoimport_marker = autoimport_marker
-        self.syntax_config = syntax_config or SyntaxHighlightConfig()
+        self.syntax_config = syntax_config or _DEFAULT_SYNTAX_CONFIG
         self.python_injector_script = python_injector_script
         self.injector_mount_path = injector_mount_path
         self.wiki_logo_path = wiki_logo_path
         self.auto_import_xml = auto_import_xml
         self.docker_volume_name = docker_volume_name
-        self.php_modules = php_modules or [
-            "memory_limit=1024M",
-            "max_execution_time=0",
-        ]
+        self.php_modules = tuple(php_modules) if php_modules else _DEFAULT_PHP_MODULES
         self.sleep_time = sleep_time
         self.bind_images_dir = bind_images_dir
         self.docker_compose_version = docker_compose_version
@@ -500,37 +770,22 @@ class PapyrusDockerComposeUnattendedSQLDatabaseVersion:
     # -------------------------------------------------------------------------
     def _generate_php_config_lines(self) -> str:
         """Render PHP configuration lines for container."""
-        lines = []
-        bOnce = False
-        for kv in self.php_modules:
-            key, value = kv.split("=", 1)
-            filename = key.replace(".", "_")
-            if not bOnce:
-                lines.append(
-                    f'echo "{key} = {value}" > /usr/local/etc/php/conf.d/{filename}.ini;'
-                )
-            else:
-                lines.append(
-                    f'    echo "{key} = {value}" > /usr/local/etc/php/conf.d/{filename}.ini;'
-                )
-            bOnce = True
-        # Use 12 spaces of indentation to match the rest of the shell block
-        return "\n            ".join(lines)
+        # Use 8 spaces of indentation to match the rest of the shell block
+        return "\n        ".join(
+            f'echo "{key} = {value}" > /usr/local/etc/php/conf.d/{key.replace(".", "_")}.ini;'
+            for key, value in (kv.split("=", 1) for kv in self.php_modules)
+        )
 
 
     # -------------------------------------------------------------------------
     def _generate_extension_loads(self) -> str:
         """Render wfLoadExtension calls for LocalSettings.php."""
-        lines = []
         # Always include the syntax highlighter extension first
-        lines.append(
-            f'echo "wfLoadExtension( \'\\\'\'{self.syntax_config.extension}\'\\\'\' );" >> /var/www/html/LocalSettings.php;'
-        )
-        for ext in self.mw_extensions:
-            lines.append(
-                f'echo "wfLoadExtension( \'\\\'\'{ext}\\\'\' );" >> /var/www/html/LocalSettings.php;'
-            )
-        return "\n          ".join(lines)
+        first = f'echo "wfLoadExtension( \'\\\'\'{self.syntax_config.extension}\'\\\'\' );" >> /var/www/html/LocalSettings.php;'
+        return "\n          ".join([first] + [
+            f'echo "wfLoadExtension( \'\\\'\'{ext}\\\'\' );" >> /var/www/html/LocalSettings.php;'
+            for ext in self.mw_extensions
+        ])
 
 
     # -------------------------------------------------------------------------
@@ -549,142 +804,36 @@ class PapyrusDockerComposeUnattendedSQLDatabaseVersion:
             '];" >> /var/www/html/LocalSettings.php;'
         )
 
+    def _generate_injector_launch(self, message: str, extra_args: str = "") -> str:
+        """Render a background lexer injector invocation, or nothing if highlighting is off."""
+        if not self.install_syntax_highlighting:
+            return ""
+        return self.INJECTOR_LAUNCH_TEMPLATE.format(
+            message=message, path=self.injector_mount_path, extra_args=extra_args
+        )
+
 
     # -------------------------------------------------------------------------
     def generate(self) -> str:
         """Generate the docker-compose.yml content as a string."""
-        php_conf = self._generate_php_config_lines()
-        ext_loads = self._generate_extension_loads()
-        skin_conf = self._generate_skin_config()
-        logo_conf = self._generate_logo_config()
-
-        transportServerPrepend = 'https://' if self.enable_ssl else 'http://'
-
-        autoRunXML = './AutoFirstRunImport.xml'
-
         images_mount = (
             "- ./images:/var/www/html/images" if self.bind_images_dir else "#- ./images:/var/www/html/images"
         )
 
-        autoimport_block = textwrap.dedent(
-            f"""echo "Contemplating auto import";
-        if [ -s /var/www/html/AutoFirstRunImport.xml ] && [ {str(self.enable_autoimport).lower()} = true ]; then
-          echo "📦 Found AutoFirstRunImport.xml — beginning import...";
-          php maintenance/importDump.php --conf /var/www/html/LocalSettings.php --username-prefix="" /var/www/html/AutoFirstRunImport.xml;
-          echo "🔁 Rebuilding site statistics...";
-          php maintenance/initSiteStats.php --update;
-          touch {self.autoimport_marker}
-        else
-          echo "🕳️ Auto import disabled or no file found.";
-        fi;
-            """
-        ).strip()
-
-        # Re-indent it for YAML’s command block (12 spaces typical)
-        autoimport_block = textwrap.indent(autoimport_block, "            ")
-
-
-        install_syntax_highlighting_consequencestring = (
-            textwrap.dedent(f"""
-                echo "Hypothecating lexer...";
-                                  python3 {self.injector_mount_path} &
-            """).strip()
-            if self.install_syntax_highlighting else ""
-        )
-
-        install_syntax_highlighting_rereg_consequencestring = (
-            textwrap.dedent(f"""
-                echo "Reregistering lexer...";
-                                  python3 {self.injector_mount_path} --rereg &
-            """).strip()
-            if self.install_syntax_highlighting else ""
+        compose_text = self.COMPOSE_TEMPLATE.format(
+            self=self,
+            transport='https://' if self.enable_ssl else 'http://',
+            auto_run_xml='./AutoFirstRunImport.xml',
+            images_mount=images_mount,
+            php_conf=self._generate_php_config_lines(),
+            ext_loads=self._generate_extension_loads(),
+            skin_conf=self._generate_skin_config(),
+            logo_conf=self._generate_logo_config(),
+            autoimport_enabled=str(self.enable_autoimport).lower(),
+            injector_launch=self._generate_injector_launch("Hypothecating lexer..."),
+            injector_rereg=self._generate_injector_launch("Reregistering lexer...", " --rereg"),
         )
 
-        compose_text = textwrap.dedent(f"""
-        
-        services:
-          papyrusproj_{self.project_name}_mediawiki_unattended_db:
-            image: {self.db_image}
-            restart: always
-            environment:
-              MYSQL_DATABASE: {self.mw_dbname}
-              MYSQL_USER: {self.mw_dbuser}
-              MYSQL_PASSWORD: {self.mw_dbpass}
-              MYSQL_ROOT_PASSWORD: {self.mw_rootpass}
-            volumes:
-              - {self.docker_volume_name}:/var/lib/mysql
-            ports:
-              - "{self.db_port}:3306"
-
-          papyrusproj_{self.project_name}_mediawiki_unattended_wikiserver:
-            image: {self.mw_image}
-            restart: always
-            ports:
-              - "{self.mw_http_port}:80"
-            environment:
-              MW_DBTYPE: mysql
-              MW_DBHOST: mediawiki_unattended_db
-              MW_DBNAME: {self.mw_dbname}
-              MW_DBUSER: {self.mw_dbuser}
-              MW_DBPASS: {self.mw_dbpass}
-              MW_SITE_NAME: "{self.mw_site_name}"
-              MW_SITE_LANG: {self.mw_site_lang}
-              MW_SERVER: "{transportServerPrepend}{self.mw_server}"
-              MW_ADMIN_USER: {self.mw_admin_user}
-              MW_ADMIN_PASS: {self.mw_admin_pass}
-            volumes:
-            {images_mount}
-              - {self.python_injector_script}:{self.injector_mount_path}
-              - {self.wiki_logo_path}:/var/www/html/resources/assets/wiki_custom_logo.png
-              - {autoRunXML}:/var/www/html/AutoFirstRunImport.xml
-            command: |
-              /bin/bash -c '
-                echo "⏳ Waiting {self.sleep_time} seconds for MariaDB to settle...";
-                sleep {self.sleep_time};
-                echo "🧠 Configuring PHP settings...";
-                {php_conf}
-
-                if [ ! -f /var/www/html/LocalSettings.php ]; then
-                  echo "⚙️ Running unattended MediaWiki installation...";
-                  php maintenance/run.php install \\
-                    --dbname={self.mw_dbname} \\
-                    --dbtype=mysql \\
-                    --dbserver=papyrusproj_{self.project_name}_mediawiki_unattended_db \\
-                    --dbport=3306 \\
-                    --dbuser={self.mw_dbuser} \\
-                    --dbpass={self.mw_dbpass} \\
-                    --installdbuser={self.mw_dbuser} \\
-                    --installdbpass={self.mw_dbpass} \\
-                    --server={transportServerPrepend}{self.mw_server} \\
-                    --scriptpath="" \\
-                    --lang={self.mw_site_lang} \\
-                    --pass={self.mw_admin_pass} \\
-                    "{self.mw_site_name}" {self.mw_admin_user};
-
-                  {install_syntax_highlighting_consequencestring}
-
-                  echo "🔌 Enabling {self.syntax_config.extension}...";
-                  {ext_loads}
-
-                  echo "🎨 Configuring logo...";
-                  {logo_conf}
-
-                  echo "🎨 Applying default skin...";
-                  {skin_conf}
-
-                  {autoimport_block}
-                  {install_syntax_highlighting_rereg_consequencestring}
-                else
-                  echo "✅ LocalSettings.php already exists — skipping installation.";
-                fi;
-                exec apache2-foreground
-              '
-
-        volumes:
-          {self.docker_volume_name}:
-        """).rstrip() + "\n"
-
-
         if not compose_text.endswith("\r\n"):
             compose_text += "\r\n"
 
@@ -703,22 +852,7 @@ class PapyrusDockerComposeUnattendedSQLDatabaseVersion:
         """
 
         # Define the add-on YAML and volumes (aligned correctly under 'services:')
-        caddy_service = textwrap.dedent(
-            f"""
-            papyrusproj_{self.project_name}_caddy:
-                image: caddy:2
-                restart: always
-                depends_on:
-                - papyrusproj_{self.project_name}_mediawiki_unattended_wikiserver
-                ports:
-                - "80:80"
-                - "443:443"
-                volumes:
-                - ./Caddyfile:/etc/caddy/Caddyfile
-                - caddy_data:/data
-                - caddy_config:/config
-            """
-        ).rstrip()
+        caddy_service = self.CADDY_SERVICE_TEMPLATE.format(project=self.project_name)
 
         # Inject the service block before the first top-level 'volumes:' section if it exists
         if "\nvolumes:" in compose_text:
@@ -732,13 +866,7 @@ class PapyrusDockerComposeUnattendedSQLDatabaseVersion:
             modified = compose_text.rstrip() + f"\n{caddy_service}\n"
 
         # Append the caddy volumes at the end (aligned at top-level)
-        modified = modified.rstrip() + textwrap.dedent(
-            """
-
-            caddy_data:
-            caddy_config:
-            """
-        )
+        modified = modified.rstrip() + self.CADDY_VOLUMES
 
         # Write the Caddyfile with appropriate TLS configuration
         caddyfile_path = os.path.join(self.output_dir, "Caddyfile")
@@ -752,19 +880,9 @@ class PapyrusDockerComposeUnattendedSQLDatabaseVersion:
             tls_line = "tls internal"
             mode = "local self-signed (internal CA)"
 
-        caddyfile_content = textwrap.dedent(f"""\
-            :80 {{
-                redir https://{{{{host}}}}:443{{{{uri}}}}
-            }}
-
-            :443 {{
-                {tls_line}
-                reverse_proxy papyrusproj_{self.project_name}_mediawiki_unattended_wikiserver:80
-            }}
-        """)
+        caddyfile_content = self.CADDYFILE_TEMPLATE.format(tls_line=tls_line, project=self.project_name)
 
-        with open(caddyfile_path, "w", encoding="utf-8") as f:
-            f.write(caddyfile_content)
+        atomic_write_bytes(caddyfile_path, caddyfile_content.encode("utf-8"))
 
         if self.verbose:
             print(f"[🔐] SSL enabled ({mode}): Caddyfile written to {caddyfile_path}")
@@ -788,8 +906,7 @@ class PapyrusDockerComposeUnattendedSQLDatabaseVersion:
         if getattr(self, "enable_ssl", False):
             compose_text = self.write_ssl_service_addendum(compose_text)
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(compose_text)
+        atomic_write_bytes(output_path, compose_text.encode("utf-8"))
 
         if self.verbose:
             print(f"[🧱] Docker Compose written to {output_path}")
@@ -799,16 +916,46 @@ class PapyrusDockerComposeUnattendedSQLDatabaseVersion:
 
 def ensure_auto_import_xml(output_xml_path: str, autoimport_target: str):
     """Ensure the generated XML is duplicated or symlinked to the autoimport location."""
-    if not os.path.exists(output_xml_path):
+    os.makedirs(os.path.dirname(autoimport_target), exist_ok=True)
+    # Copy beside the target and rename over it, so the swap is a single atomic replace
+    part_path = os.fspath(autoimport_target) + ".part"
+    try:
+        shutil.copyfile(output_xml_path, part_path)
+    except FileNotFoundError:
         print(f"[⚠️] No output XML found at {output_xml_path}; skipping autoimport copy.")
         return
-    os.makedirs(os.path.dirname(autoimport_target), exist_ok=True)
-    if os.path.exists(autoimport_target):
-        os.remove(autoimport_target)
-    shutil.copy2(output_xml_path, autoimport_target)
+    shutil.copystat(output_xml_path, part_path)
+    os.replace(part_path, autoimport_target)
     print(f"[📦] Copied {output_xml_path} → {autoimport_target} for auto-import.")
 
 
+def _port_is_free(port: int) -> bool:
+    import socket
+
+    # Docker publishes on every interface, so probe the wildcard address the same way
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.bind(("", port))
+        except OSError:
+            return False
+    return True
+
+
+def _pick_free_port_pair(base_mw: int, base_db: int, tries: int = 32, spread: int = 500):
+    """
+    Return (mw_port, db_port) at a shared random offset below `spread` where both ports
+    can be bound right now, trying up to `tries` offsets. Falls back to the first offset
+    drawn when none of them is free.
+    """
+    import random
+
+    offsets = random.sample(range(spread), min(tries, spread))
+    for offset in offsets:
+        if _port_is_free(base_mw + offset) and _port_is_free(base_db + offset):
+            return base_mw + offset, base_db + offset
+    return base_mw + offsets[0], base_db + offsets[0]
+
+
 
 
 # e.g. for Starfield (but note that these types do not need to be known...)
@@ -917,68 +1064,168 @@ KNOWN_TYPES = {
 INCLUDE_GENERATION_MARKER = True
 INCLUDE_MARKER_SECONDS = True
 
+# SOURCE_DATE_EPOCH (reproducible-builds.org) pins the marker and XML revision timestamps,
+# so rebuilding unchanged scripts gives byte-identical output
+_epoch = os.environ.get("SOURCE_DATE_EPOCH", "").strip()
+SOURCE_DATE_EPOCH: Optional[int] = int(_epoch) if _epoch.isdigit() else None
+del _epoch
+
+# Last marker built, keyed by (epoch second, seconds precision); pages emitted within
+# the same second share it
+_MARKER_CACHE = [None, ""]
+
 def _generation_marker() -> str:
     """Return an invisible MediaWiki marker identifying generator and timestamp."""
     if not INCLUDE_GENERATION_MARKER:
         return ""
 
+    now = SOURCE_DATE_EPOCH if SOURCE_DATE_EPOCH is not None else int(time.time())
+    key = (now, INCLUDE_MARKER_SECONDS)
+    if key == _MARKER_CACHE[0]:
+        return _MARKER_CACHE[1]
+
     # Choose timestamp precision
-    timespec = "seconds" if INCLUDE_MARKER_SECONDS else "minutes"
-    ts = datetime.utcnow().isoformat(timespec=timespec)
+    fmt = "%Y-%m-%dT%H:%M:%S" if INCLUDE_MARKER_SECONDS else "%Y-%m-%dT%H:%M"
+    ts = time.strftime(fmt, time.gmtime(now))
+
+    marker = f"<noinclude><!-- Generated by ReedPapyri at {ts} UTC --></noinclude>"
+    _MARKER_CACHE[0] = key
+    _MARKER_CACHE[1] = marker
+    return marker
+
+
+# Frozen snapshot of KNOWN_TYPES plus one alternation over every name, so inline linking
+# is a single scan. Both are rebuilt by _finalize_types(); any later change to
+# KNOWN_TYPES must go through it again, or linking keeps using the old snapshot.
+_KNOWN_TYPES = MappingProxyType({})
+_KNOWN_TYPES_RE = None
 
-    return f"<noinclude><!-- Generated by ReedPapyri at {ts} UTC --></noinclude>"
+# script name -> extends, for every script in the current run (see index_script_parents)
+_PARENT_OF: Dict[str, str] = {}
+
+
+def _inheritance_chain(name: str, extends: str) -> List[str]:
+    """Return `name` and its known ancestors, root first."""
+    # Walk up through known parents, leaf first, then flip once
+    chain = [name]
+    base = extends
+    while base and base not in chain and (base in _KNOWN_TYPES or base in _PARENT_OF):
+        chain.append(base)
+        base = _PARENT_OF.get(base, "")
+    chain.reverse()
+    return chain
+
+
+def linkify_known_types(text: str) -> str:
+    """Replace every standalone known type name in `text` with its wiki link."""
+    return _KNOWN_TYPES_RE.sub(lambda m: _KNOWN_TYPES[m.group(0)], text)
 
 
 def link_type(t: str) -> str:
     """Link known Papyrus types to wiki pages, including inline text linking."""
-    t = t.strip()
+    return _link_type_cached(t.strip())
+
+
+# The same handful of type names recur across every property and signature, so
+# results are memoized; _finalize_types clears this alongside the snapshot.
+@functools.lru_cache(maxsize=4096)
+def _link_type_cached(t: str) -> str:
     # If it's a known type name, return linked version
-    if t in KNOWN_TYPES:
-        return KNOWN_TYPES[t]
+    if t in _KNOWN_TYPES:
+        return _KNOWN_TYPES[t]
+    # A single alphanumeric word that is not a known type has nothing to link
+    if t.isalnum():
+        return t
     # Inline linking for words like 'Faction' inside sentences
-    for typename, link in KNOWN_TYPES.items():
-        # Match standalone words only (avoid partial matches)
-        t = re.sub(rf'\b{typename}\b', f"{link}", t)
-    return t
+    return linkify_known_types(t)
+
+
+def _finalize_types():
+    global _KNOWN_TYPES, _KNOWN_TYPES_RE
+    _KNOWN_TYPES = MappingProxyType(dict(KNOWN_TYPES))
+    # Match standalone words only (avoid partial matches); longest names first so a
+    # prefix like "Form" is never tried ahead of "FormList"
+    names = sorted(_KNOWN_TYPES, key=len, reverse=True)
+    # Leading lookahead over the names' first characters lets the scan skip every other
+    # position (most description text is lowercase) before trying the alternation
+    first_chars = "".join(sorted({re.escape(n[0]) for n in names if n}))
+    lead = f"(?=[{first_chars}])" if first_chars else ""
+    _KNOWN_TYPES_RE = re.compile(lead + r"\b(?:" + "|".join(map(re.escape, names)) + r")\b")
+    _link_type_cached.cache_clear()
+
+_finalize_types()
 
 
 def merge_user_types(user_type_file: Optional[str]):
     if user_type_file and Path(user_type_file).exists():
-        with open(user_type_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        raw = Path(user_type_file).read_bytes()
+        # msgspec decodes large type lists several times faster; stdlib json is the fallback
+        try:
+            import msgspec
+        except ImportError:
+            data = json.loads(raw)
+        else:
+            data = msgspec.json.decode(raw)
         for t in data:
             KNOWN_TYPES[t] = f"[[{t} Script]]"
+        _finalize_types()
+
+
 
 
 
 
+# Fixed category blocks, pre-joined so each page splices one string instead of several lines
+_FUNCTION_PAGE_CATEGORIES = "[[Category:Scripting]]\n[[Category:Papyrus]]\n"
+_EVENT_PAGE_CATEGORIES = "[[Category:Scripting]]\n[[Category:Papyrus]]\n[[Category:Events]]\n"
+_SCRIPT_PAGE_CATEGORIES = "[[Category:Scripting]]\n[[Category:Papyrus]]\n[[Category:Script Objects]]\n"
+
+_RETURN_RE = re.compile(r"\breturn", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_params(params: str) -> tuple:
+    """Split a parameter list into (declaration, name) pairs, e.g. ("int aiCount", "aiCount")."""
+    # Identical signatures recur across scripts, so each is split only once
+    parts = [p.strip() for p in params.split(",") if p.strip()]
+    return tuple((p, p.rsplit(maxsplit=1)[-1]) for p in parts)
 
 
 class PapyrusStruct:
+    __slots__ = ("name", "members", "description")
+
     def __init__(self, name: str, members: List[str], description: str = ""):
         self.name = name
         self.members = members
         self.description = description
 
-    def to_mediawiki(self) -> str:
-        lines = [f"=== {self.name} ==="]
+    def to_mediawiki(self, out: Optional[io.StringIO] = None) -> str:
+        """Render the struct; with `out`, write into it newline-terminated and return ""."""
+        tags = SYNTAX_TAGS
+        buf = out if out is not None else io.StringIO()
+        w = buf.write
+        w(f"=== {self.name} ===\n")
         if self.description:
-            lines.append(self.description)
-        #lines.append("<syntaxhighlight lang=\"papyrus\">")
-        lines.append(OPEN_SYNTAXHIGHLIGHT_EMITSENTINEL)
-        lines.append(f"Struct {self.name}")
+            w(f"{self.description}\n")
+        #w("<syntaxhighlight lang=\"papyrus\">\n")
+        w(f"{tags.open_tag}\n")
+        w(f"Struct {self.name}\n")
         for m in self.members:
-            lines.append(f" {m}")
-        lines.append("EndStruct")
-        #lines.append("</syntaxhighlight>")
-        lines.append(CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL)
-        lines.append("")
+            w(f" {m}\n")
+        w("EndStruct\n")
+        #w("</syntaxhighlight>\n")
+        w(f"{tags.close_tag}\n\n")
         for m in self.members:
-            lines.append(f"*'''{m}'''")
-        return "\n".join(lines)
+            w(f"*'''{m}'''\n")
+        if out is not None:
+            return ""
+        # Standalone callers get the text without the final newline
+        return buf.getvalue()[:-1]
 
 
 class PapyrusProperty:
+    __slots__ = ("name", "prop_type", "flags", "description")
+
     def __init__(self, name: str, prop_type: str, flags: str = "", description: str = ""):
         self.name = name
         self.prop_type = prop_type
@@ -992,6 +1239,10 @@ class PapyrusProperty:
 
 
 class PapyrusFunction:
+    # Large scripts hold thousands of these, so no per-instance __dict__
+    __slots__ = ("name", "return_type", "params", "flags", "description", "param_docs",
+                 "references", "examples", "_rendered")
+
     def __init__(
         self,
         name: str,
@@ -1009,9 +1260,23 @@ class PapyrusFunction:
         self.param_docs = param_docs or {}
         self.references: set[str] = set()
         self.examples: list[str] = []  # store discovered example lines if found
+        self._rendered: Dict[tuple, str] = {}
 
-    # --- New Helper: Generate smarter, style-matched wiki output ---
     def to_mediawiki(self, parent_script: str, siblings: List[str]) -> str:
+        # Only the first three siblings appear on the page, so they are all the key needs
+        key = (parent_script, tuple(siblings[:3]), SYNTAX_TAGS)
+        page = self._rendered.get(key)
+        if page is None:
+            page = self._rendered[key] = self._render(parent_script, siblings)
+        return page
+
+    def invalidate(self):
+        """Drop cached pages after mutating the function."""
+        self._rendered.clear()
+
+    # --- New Helper: Generate smarter, style-matched wiki output ---
+    def _render(self, parent_script: str, siblings: List[str]) -> str:
+        tags = SYNTAX_TAGS
         desc = self.description.strip()
         if not desc:
             desc = f"Documentation for {self.name}."
@@ -1020,19 +1285,17 @@ class PapyrusFunction:
         desc = link_type(desc)
 
         markup = [
-            "[[Category:Scripting]]",
-            "[[Category:Papyrus]]",
-            f"'''Member of:''' [[{parent_script} Script]]",
+            f"{_FUNCTION_PAGE_CATEGORIES}'''Member of:''' [[{parent_script} Script]]",
             "",
             desc,
             "",
             "== Syntax ==",
-            OPEN_SYNTAXHIGHLIGHT_EMITSENTINEL,
+            tags.open_tag,
             #"<syntaxhighlight lang=\"papyrus\">",
             f"{self.return_type} Function {self.name}({self.params})".strip()
             + (f" {self.flags.strip()}" if self.flags else ""),
             #"</syntaxhighlight>",
-            CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL,
+            tags.close_tag,
         ]
 
         # Only emit Flags section for meaningful (non-trivial) flags
@@ -1077,33 +1340,32 @@ class PapyrusFunction:
             return "None."
         linked_type = link_type(self.return_type)
         # if description already mentions what is returned, just clarify type
-        if re.search(r"\breturn", self.description, re.IGNORECASE):
+        if _RETURN_RE.search(self.description):
             return f"The function returns a {linked_type}."
         # Generic but human phrasing
         return f"The {linked_type} that this function returns."
 
     def _format_examples(self) -> str:
         """Return example block text or fallback template."""
+        tags = SYNTAX_TAGS
         if self.examples:
-            return OPEN_SYNTAXHIGHLIGHT_EMITSENTINEL + "\n" + "\n".join(self.examples) + "\n" + CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL
+            return tags.open_tag + "\n" + "\n".join(self.examples) + "\n" + tags.close_tag
 
         # Attempt to suggest realistic placeholder
-        sample_call = f"{self.name}({', '.join([p.split()[-1] for p in self.params.split(',') if p.strip()])})"
+        sample_call = f"{self.name}({', '.join([pname for _, pname in _parse_params(self.params)])})"
         return (
-            OPEN_SYNTAXHIGHLIGHT_EMITSENTINEL + "\n" +
+            tags.open_tag + "\n" +
             f"; Example usage of {self.name}\n" +
             f"result = {sample_call}\n" +
-            CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL
+            tags.close_tag
         )
 
 
     def _format_params(self) -> str:
         if not self.params.strip():
             return "None."
-        parts = [p.strip() for p in self.params.split(",") if p.strip()]
         out = []
-        for p in parts:
-            pname = p.split()[-1]
+        for p, pname in _parse_params(self.params):
             desc = self.param_docs.get(pname, "")
             out.append(f"*'''{p}'''" + (f": {desc}" if desc else ""))
         return "\n".join(out)
@@ -1111,38 +1373,51 @@ class PapyrusFunction:
 
 
 class PapyrusEvent:
+    # `state` is only set for events declared inside a State block
+    __slots__ = ("name", "params", "description", "param_docs", "references", "state", "_rendered")
+
     def __init__(self, name: str, params: str, description: str = "", param_docs: Dict[str, str] = None):
         self.name = name
         self.params = params
         self.description = description
         self.param_docs = param_docs or {}
         self.references: set[str] = set()
+        self._rendered: Dict[tuple, str] = {}
 
     def to_mediawiki(self, parent_script: str, siblings: List[str]) -> str:
+        key = (parent_script, tuple(siblings[:3]), SYNTAX_TAGS)
+        page = self._rendered.get(key)
+        if page is None:
+            page = self._rendered[key] = self._render(parent_script, siblings)
+        return page
+
+    def invalidate(self):
+        """Drop cached pages after mutating the event."""
+        self._rendered.clear()
+
+    def _render(self, parent_script: str, siblings: List[str]) -> str:
+        tags = SYNTAX_TAGS
         markup = [
-            "[[Category:Scripting]]",
-            "[[Category:Papyrus]]",
-            "[[Category:Events]]",
-            f"'''Member of:''' [[{parent_script} Script]]",
+            f"{_EVENT_PAGE_CATEGORIES}'''Member of:''' [[{parent_script} Script]]",
             "",
             self.description or f"Event called when {self.name} occurs.",
             "",
             "== Syntax ==",
-            OPEN_SYNTAXHIGHLIGHT_EMITSENTINEL,
+            tags.open_tag,
             f"Event {self.name}({self.params})",
             #"</syntaxhighlight>",
-            CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL,
+            tags.close_tag,
             "",
             "== Parameters ==",
             self._format_params(),
             "",
             "== Examples ==",
-            OPEN_SYNTAXHIGHLIGHT_EMITSENTINEL,
+            tags.open_tag,
             f"Event {self.name}({self.params})",
             f" Debug.Trace(\"{self.name} triggered\")",
             "endEvent",
             #"</syntaxhighlight>",
-            CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL,
+            tags.close_tag,
             "",
             "== See Also ==",
             f"*[[{parent_script} Script]]",
@@ -1157,16 +1432,16 @@ class PapyrusEvent:
     def _format_params(self) -> str:
         if not self.params.strip():
             return "None."
-        parts = [p.strip() for p in self.params.split(",") if p.strip()]
         out = []
-        for p in parts:
-            pname = p.split()[-1]
+        for p, pname in _parse_params(self.params):
             desc = self.param_docs.get(pname, "")
             out.append(f"*'''{p}'''" + (f": {desc}" if desc else ""))
         return "\n".join(out)
 
 
 class PapyrusScript:
+    __slots__ = ("name", "extends", "properties", "functions", "events", "structs", "flags", "_rendered")
+
     def __init__(self, name: str, extends: str, flags: Optional[List[str]] = None):
         self.name = name
         self.extends = extends
@@ -1175,78 +1450,82 @@ class PapyrusScript:
         self.events: List[PapyrusEvent] = []
         self.structs: List[PapyrusStruct] = []
         self.flags: List[str] = []
-
+        self._rendered: Dict[SyntaxHighlightTags, str] = {}
 
     def to_mediawiki(self) -> str:
-        out = [
-            f"'''Extends:''' [[{self.extends} Script]]",
-            "",
-            f"Script for manipulating {self.name} instances.",
-            "",
-        ]
-        out.append("== Definition ==")
-        out.append("<syntaxhighlight lang=\"papyrus\">")
+        # Rendered once per highlight language; sinks writing the same script reuse it
+        page = self._rendered.get(SYNTAX_TAGS)
+        if page is None:
+            page = self._rendered[SYNTAX_TAGS] = self._render()
+        return page
+
+    def invalidate(self):
+        """Drop the cached page after adding members or changing the script."""
+        self._rendered.clear()
+
+    def _render(self) -> str:
+        tags = SYNTAX_TAGS
+        # One buffer for the whole page; structs write into it directly
+        buf = io.StringIO()
+        w = buf.write
+        w(f"'''Extends:''' [[{self.extends} Script]]\n\n")
+        w(f"Script for manipulating {self.name} instances.\n\n")
+        w("== Definition ==\n")
+        w("<syntaxhighlight lang=\"papyrus\">\n")
         if self.flags and len(self.flags) > 0:
             flagsListString = ' '.join(self.flags)
-            out.append(f"ScriptName {self.name} extends {self.extends} {flagsListString}")
+            w(f"ScriptName {self.name} extends {self.extends} {flagsListString}\n")
         else:
-            out.append(f"ScriptName {self.name} extends {self.extends}")
-        #out.append("</syntaxhighlight>")
-        out.append(CLOSE_SYNTAXHIGHLIGHT_EMITSENTINEL)
-        out.append("")
+            w(f"ScriptName {self.name} extends {self.extends}\n")
+        #w("</syntaxhighlight>\n")
+        w(f"{tags.close_tag}\n\n")
         if self.extends:
-            chain = [self.name]
-            base = self.extends
-            while base in KNOWN_TYPES:
-                chain.insert(0, base)
-                base = ""
-            out.append("== Inheritance ==")
-            out.append(" → ".join(chain))
-            out.append("")
-        out.append("== Summary ==")
-        out.append("{| class=\"wikitable\"")
-        out.append("! Category !! Count")
-        out.append(f"|-\n| Properties || {len(self.properties)}")
-        out.append(f"|-\n| Functions || {len(self.functions)}")
-        out.append(f"|-\n| Events || {len(self.events)}")
-        out.append("|}")
-        out.append("")
+            w("== Inheritance ==\n")
+            w(" → ".join(_inheritance_chain(self.name, self.extends)))
+            w("\n\n")
+        w("== Summary ==\n")
+        w("{| class=\"wikitable\"\n")
+        w("! Category !! Count\n")
+        w(f"|-\n| Properties || {len(self.properties)}\n")
+        w(f"|-\n| Functions || {len(self.functions)}\n")
+        w(f"|-\n| Events || {len(self.events)}\n")
+        w("|}\n\n")
         if self.structs:
-            out.append("== Structs ==")
+            w("== Structs ==\n")
             for s in self.structs:
-                out.append(s.to_mediawiki())
-            out.append("")
+                s.to_mediawiki(buf)
+            w("\n")
         if self.properties:
-            out.append("== Properties ==")
+            w("== Properties ==\n")
             globals_ = [p for p in self.properties if p.prop_type.lower() == "globalvariable"]
             others = [p for p in self.properties if p.prop_type.lower() != "globalvariable"]
             if globals_:
-                out.append("=== Global Properties ===")
+                w("=== Global Properties ===\n")
                 for g in globals_:
-                    out.append(g.to_mediawiki())
-                out.append("")
+                    w(f"{g.to_mediawiki()}\n")
+                w("\n")
             if others:
-                out.append("=== Script Properties ===")
+                w("=== Script Properties ===\n")
                 for p in others:
-                    out.append(p.to_mediawiki())
-                out.append("")
+                    w(f"{p.to_mediawiki()}\n")
+                w("\n")
         if self.functions:
-            out.append("== Member Functions ==")
+            w("== Member Functions ==\n")
             for fn in self.functions:
-                out.append(f"*Function [[{fn.name} - {self.name}|{fn.name}]]({fn.params})")
+                w(f"*Function [[{fn.name} - {self.name}|{fn.name}]]({fn.params})\n")
                 if fn.description:
-                    out.append(f"**{fn.description}")
-            out.append("")
+                    w(f"**{fn.description}\n")
+            w("\n")
         if self.events:
-            out.append("== Events ==")
+            w("== Events ==\n")
             for ev in self.events:
-                out.append(f"*Event [[{ev.name} - {self.name}|{ev.name}]]({ev.params})")
+                w(f"*Event [[{ev.name} - {self.name}|{ev.name}]]({ev.params})\n")
                 if ev.description:
-                    out.append(f"**{ev.description}")
-            out.append("")
-        out.append("[[Category:Scripting]]\n[[Category:Papyrus]]\n[[Category:Script Objects]]")
-        out.append(_generation_marker())
-        return "\n".join(out)
+                    w(f"**{ev.description}\n")
+            w("\n")
+        w(_SCRIPT_PAGE_CATEGORIES)
+        w(_generation_marker())
+        return buf.getvalue()
 
 
 
@@ -1260,6 +1539,14 @@ class DocSink:
     def write_misc(self, title: str, text: str):
         """Optional: write non-script pages (like indexes, readmes, etc.)."""
         raise NotImplementedError
+    def write_bulk(self, scripts: Iterable["PapyrusScript"]):
+        """Write each script with all of its functions and events; sinks may override to batch."""
+        for script in scripts:
+            self.write_script(script)
+            for fn in script.functions:
+                self.write_function(script.name, fn)
+            for ev in script.events:
+                self.write_event(script.name, ev)
     def finalize(self):
         pass
 
@@ -1273,21 +1560,33 @@ class SQLDocSink(DocSink):
 
     Automatically ensures tables exist and commits safely.
 
-    Optional batching mode:
-      enable_batch=True -> cache writes and flush in bulk
+    Batching mode (default):
+      enable_batch=True -> cache writes and flush in bulk, one commit per flush
+      enable_batch=False -> insert (and, with autocommit, commit) row by row
       batch_id -> logical grouping tag (for logging or partitioning)
+
+    With quash_errors, a batch the database rejects is retried row by row under a
+    savepoint, and only the offending rows are skipped (with a warning on stderr).
     """
 
+    # Insert columns per table; the INSERT statements are built from these once per sink
+    TABLE_COLUMNS = {
+        "scripts": ("name", "extends", "summary"),
+        "functions": ("script_name", "name", "return_type", "params", "flags", "description"),
+        "events": ("script_name", "name", "params", "description"),
+        "misc_pages": ("title", "content"),
+    }
+
     def __init__(
         self,
-        conn: Union[str, Path, sqlite3.Connection],
+        conn: Union[str, Path, "sqlite3.Connection"],
         dialect: str = "sqlite",
         schema: Optional[str] = None,
-        autocommit: bool = True,  # May thrash writes but prevent schema out-of-order linking problems.
+        autocommit: bool = False,  # True may thrash writes but prevent schema out-of-order linking problems.
         quash_errors: bool = True,
-        enable_batch: bool = False,
+        enable_batch: bool = True,
         batch_id: Optional[str] = None,
-        batch_size: int = 1000,
+        batch_size: int = 5000,
     ):
         self.dialect = dialect.lower()
         self.schema = schema
@@ -1296,11 +1595,25 @@ class SQLDocSink(DocSink):
         self.enable_batch = enable_batch
         self.batch_id = batch_id
         self.batch_size = batch_size
+        self._finalized = False
+
+        placeholder = "?" if self.dialect == "sqlite" else "%s"
+        self._insert_sql = {
+            table: f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join([placeholder] * len(cols))})"
+            for table, cols in self.TABLE_COLUMNS.items()
+        }
+        # psycopg2's execute_values expands a single VALUES %s into multi-row inserts
+        self._values_sql = {
+            table: f"INSERT INTO {table} ({', '.join(cols)}) VALUES %s"
+            for table, cols in self.TABLE_COLUMNS.items()
+        }
 
         # --- normalize connection ---
-        if isinstance(conn, (str, Path)):
+        self._owns_conn = isinstance(conn, (str, Path))
+        if self._owns_conn:
             conn_str = str(conn)
             if self.dialect == "sqlite":
+                import sqlite3
                 self.conn = sqlite3.connect(conn_str)
             elif self.dialect in ("postgres", "postgresql"):
                 import psycopg2
@@ -1311,6 +1624,12 @@ class SQLDocSink(DocSink):
             self.conn = conn  # already a live connection
 
         self.cur = self.conn.cursor()
+        # Bulk path for flushes: "psycopg2" (execute_values), "psycopg" (v3 pipeline) or None
+        self._pg_driver = None
+        if self.dialect.startswith("post"):
+            driver = type(self.conn).__module__.split(".", 1)[0]
+            if driver in ("psycopg2", "psycopg"):
+                self._pg_driver = driver
         self._ensure_schema()
 
         # --- batch buffers ---
@@ -1330,6 +1649,15 @@ class SQLDocSink(DocSink):
         if self.dialect == "sqlite":
             prefix = ""
             id_type = "INTEGER PRIMARY KEY AUTOINCREMENT"
+            # Bulk-load tuning, only on connections this sink opened itself
+            if self._owns_conn:
+                # WAL is persistent in the database file, so only switch when it isn't set yet
+                if self.cur.execute("PRAGMA journal_mode;").fetchone()[0].lower() != "wal":
+                    self.cur.execute("PRAGMA journal_mode=WAL;")
+                self.cur.execute("PRAGMA synchronous=NORMAL;")
+                self.cur.execute("PRAGMA temp_store=MEMORY;")
+                self.cur.execute("PRAGMA cache_size=-65536;")  # 64 MiB page cache
+                self.cur.execute("PRAGMA busy_timeout=5000;")  # wait out a concurrent reader instead of failing
         elif self.dialect.startswith("post"):
             prefix = f"{self.schema}." if self.schema else ""
             id_type = "SERIAL PRIMARY KEY"
@@ -1398,128 +1726,169 @@ class SQLDocSink(DocSink):
             raise RuntimeError(f"SQLDocSink query failed: {e}") from e
 
     def _batch_append(self, table: str, row: tuple):
-        """Append a row to a batch buffer, flushing if over threshold."""
+        """Append a row to a batch buffer, flushing every buffer if this one is over threshold."""
         buf = self._batch_buffers[table]
         buf.append(row)
         if len(buf) >= self.batch_size:
-            self._flush_table(table)
+            # All tables go out together, so a script and its functions land in the same commit
+            self.flush_all()
 
-    def _flush_table(self, table: str):
-        """Flush one table’s buffer using executemany."""
+    def _flush_table(self, table: str, commit: bool = True):
+        """Flush one table’s buffer in bulk: execute_values (psycopg2), a pipeline (psycopg 3) or executemany."""
         buf = self._batch_buffers[table]
         if not buf:
             return
 
-        if table == "scripts":
-            query = (
-                "INSERT INTO scripts (name, extends, summary) VALUES (?, ?, ?)"
-                if self.dialect == "sqlite"
-                else "INSERT INTO scripts (name, extends, summary) VALUES (%s, %s, %s)"
-            )
-        elif table == "functions":
-            query = (
-                "INSERT INTO functions (script_name, name, return_type, params, flags, description) VALUES (?, ?, ?, ?, ?, ?)"
-                if self.dialect == "sqlite"
-                else "INSERT INTO functions (script_name, name, return_type, params, flags, description) VALUES (%s, %s, %s, %s, %s, %s)"
-            )
-        elif table == "events":
-            query = (
-                "INSERT INTO events (script_name, name, params, description) VALUES (?, ?, ?, ?)"
-                if self.dialect == "sqlite"
-                else "INSERT INTO events (script_name, name, params, description) VALUES (%s, %s, %s, %s)"
-            )
-        elif table == "misc_pages":
-            query = (
-                "INSERT INTO misc_pages (title, content) VALUES (?, ?)"
-                if self.dialect == "sqlite"
-                else "INSERT INTO misc_pages (title, content) VALUES (%s, %s)"
-            )
-        else:
+        query = self._insert_sql.get(table)
+        if query is None:
             raise ValueError(f"Unknown table for batch flush: {table}")
 
+        # The savepoint scopes a failed batch to this table, so rows already flushed for the
+        # other tables stay in the surrounding transaction. It must be nested: on SQLite a
+        # SAVEPOINT outside a transaction opens one that RELEASE commits, so BEGIN first.
+        # PostgreSQL only allows savepoints inside a transaction block, so autocommit
+        # connections go without.
+        savepoint = f"flush_{table}" if not (self.dialect.startswith("post") and getattr(self.conn, "autocommit", False)) else None
         try:
-            self.cur.executemany(query, buf)
-            self.conn.commit()
+            if savepoint:
+                if self.dialect == "sqlite" and not self.conn.in_transaction:
+                    self.cur.execute("BEGIN")
+                self.cur.execute(f"SAVEPOINT {savepoint}")
+            try:
+                if self._pg_driver == "psycopg2":
+                    from psycopg2.extras import execute_values
+                    execute_values(self.cur, self._values_sql[table], buf, page_size=self.batch_size)
+                elif self._pg_driver == "psycopg":
+                    # psycopg 3 pipeline mode sends the whole batch without waiting per row
+                    with self.conn.pipeline():
+                        self.cur.executemany(query, buf)
+                else:
+                    self.cur.executemany(query, buf)
+            except Exception as e:
+                if not (savepoint and self.quash_errors):
+                    raise
+                self.cur.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                rejected = self._insert_rows_singly(query, buf)
+                print(f"[SQLDocSink] Warning: skipped {rejected} of {len(buf)} {table} rows: {e}", file=sys.stderr)
+            if savepoint:
+                self.cur.execute(f"RELEASE SAVEPOINT {savepoint}")
+            if commit:
+                self.conn.commit()
         except Exception as e:
-            self.conn.rollback()
+            self._rollback_batch(savepoint)
             raise RuntimeError(f"SQLDocSink batch flush failed for {table}: {e}") from e
         finally:
             buf.clear()
 
+    def _rollback_batch(self, savepoint: Optional[str]):
+        """Undo a failed flush: only its savepoint when it has one, otherwise the whole transaction."""
+        if savepoint:
+            try:
+                self.cur.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                self.cur.execute(f"RELEASE SAVEPOINT {savepoint}")
+                return
+            except Exception:
+                pass  # savepoint never opened or already released; fall back to a full rollback
+        self.conn.rollback()
+
+    def _insert_rows_singly(self, query: str, rows: list) -> int:
+        """Retry a failed batch one row at a time, each under its own savepoint; return the number rejected."""
+        rejected = 0
+        for row in rows:
+            self.cur.execute("SAVEPOINT flush_row")
+            try:
+                self.cur.execute(query, row)
+            except Exception:
+                self.cur.execute("ROLLBACK TO SAVEPOINT flush_row")
+                rejected += 1
+            self.cur.execute("RELEASE SAVEPOINT flush_row")
+        return rejected
+
     def flush_all(self):
-        """Flush all pending batch buffers."""
+        """Flush all pending batch buffers in a single transaction.
+
+        A table that fails only rolls back its own savepoint; the other tables are still
+        committed before the first error is re-raised.
+        """
+        first_error = None
         for table in self._batch_buffers.keys():
-            self._flush_table(table)
+            try:
+                self._flush_table(table, commit=False)
+            except RuntimeError as e:
+                if first_error is None:
+                    first_error = e
+        self.conn.commit()
+        if first_error is not None:
+            raise first_error
 
     # -------------------------------------------------------------------------
     # PUBLIC WRITE METHODS
     # -------------------------------------------------------------------------
 
+    # Row layouts follow TABLE_COLUMNS; shared by the single-row and bulk writers
+    @staticmethod
+    def _script_row(script: "PapyrusScript") -> tuple:
+        return (script.name, script.extends, f"{len(script.functions)} funcs, {len(script.events)} events")
+
+    @staticmethod
+    def _function_row(script_name: str, fn: "PapyrusFunction") -> tuple:
+        return (script_name, fn.name, fn.return_type, fn.params, fn.flags, fn.description)
+
+    @staticmethod
+    def _event_row(script_name: str, ev: "PapyrusEvent") -> tuple:
+        return (script_name, ev.name, ev.params, ev.description)
+
     def write_misc(self, title: str, text: str):
         row = (title, text)
         if self.enable_batch:
             self._batch_append("misc_pages", row)
         else:
-            self._execute_safe(
-                "INSERT INTO misc_pages (title, content) VALUES (?, ?)"
-                if self.dialect == "sqlite"
-                else "INSERT INTO misc_pages (title, content) VALUES (%s, %s)",
-                row,
-            )
+            self._execute_safe(self._insert_sql["misc_pages"], row)
 
     def write_script(self, script: "PapyrusScript"):
-        row = (
-            script.name,
-            script.extends,
-            f"{len(script.functions)} funcs, {len(script.events)} events",
-        )
+        row = self._script_row(script)
         if self.enable_batch:
             self._batch_append("scripts", row)
         else:
-            self._execute_safe(
-                "INSERT INTO scripts (name, extends, summary) VALUES (?, ?, ?)"
-                if self.dialect == "sqlite"
-                else "INSERT INTO scripts (name, extends, summary) VALUES (%s, %s, %s)",
-                row,
-            )
+            self._execute_safe(self._insert_sql["scripts"], row)
 
     def write_function(self, script_name: str, fn: "PapyrusFunction"):
-        row = (
-            script_name,
-            fn.name,
-            fn.return_type,
-            fn.params,
-            fn.flags,
-            fn.description,
-        )
+        row = self._function_row(script_name, fn)
         if self.enable_batch:
             self._batch_append("functions", row)
         else:
-            self._execute_safe(
-                "INSERT INTO functions (script_name, name, return_type, params, flags, description) VALUES (?, ?, ?, ?, ?, ?)"
-                if self.dialect == "sqlite"
-                else "INSERT INTO functions (script_name, name, return_type, params, flags, description) VALUES (%s, %s, %s, %s, %s, %s)",
-                row,
-            )
+            self._execute_safe(self._insert_sql["functions"], row)
 
     def write_event(self, script_name: str, ev: "PapyrusEvent"):
-        row = (script_name, ev.name, ev.params, ev.description)
+        row = self._event_row(script_name, ev)
         if self.enable_batch:
             self._batch_append("events", row)
         else:
-            self._execute_safe(
-                "INSERT INTO events (script_name, name, params, description) VALUES (?, ?, ?, ?)"
-                if self.dialect == "sqlite"
-                else "INSERT INTO events (script_name, name, params, description) VALUES (%s, %s, %s, %s)",
-                row,
-            )
+            self._execute_safe(self._insert_sql["events"], row)
+
+    def write_bulk(self, scripts: Iterable["PapyrusScript"]):
+        """Queue whole scripts with one extend per table, checking the flush threshold once per script."""
+        if not self.enable_batch:
+            return super().write_bulk(scripts)
+        bufs = self._batch_buffers
+        fn_row, ev_row = self._function_row, self._event_row
+        for script in scripts:
+            name = script.name
+            bufs["scripts"].append(self._script_row(script))
+            bufs["functions"].extend([fn_row(name, fn) for fn in script.functions])
+            bufs["events"].extend([ev_row(name, ev) for ev in script.events])
+            if max(map(len, bufs.values())) >= self.batch_size:
+                self.flush_all()
 
     # -------------------------------------------------------------------------
     # FINALIZATION
     # -------------------------------------------------------------------------
 
     def finalize(self):
-        """Safely flush, commit, and close all SQL resources."""
+        """Safely flush, commit, and close all SQL resources (once; later calls do nothing)."""
+        if self._finalized:
+            return
+        self._finalized = True
         commit_err = None
 
         try:
@@ -1553,9 +1922,24 @@ class SQLDocSink(DocSink):
 
 
 
+def _xml_leaf(tag: str, text: str, attrs: str = "") -> str:
+    """Serialize a text-only element the way ElementTree does, including the short empty form."""
+    if not text:
+        return f"<{tag}{attrs} />"
+    escaped = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return f"<{tag}{attrs}>{escaped}</{tag}>"
+
+
 class ArchiveDocSink(DocSink):
     """
-    Collects all wiki pages in-memory, writes either a ZIP archive or a full MediaWiki XML dump.
+    Collects all wiki pages into either a ZIP archive or a full MediaWiki XML dump.
+
+    Pages are buffered in memory unless `path` is given, in which case they stream to
+    `path` (via a .part file that finalize() moves into place).
+
+    ZIP entries are deflated at `compresslevel` (3 by default; level 1 is faster still at a
+    slightly larger archive). `compression=zipfile.ZIP_STORED` skips zlib entirely, for
+    throwaway archives that are unpacked right away.
     """
 
     def __init__(
@@ -1563,27 +1947,49 @@ class ArchiveDocSink(DocSink):
         mode="zip",
         site_name="PapyrusDocs",
         base_url="http://localhost/wiki/Main_Page",
-        contributor="ReedPapyri"
+        contributor="ReedPapyri",
+        compresslevel: int = 3,  # zlib level for ZIP mode; wiki text compresses well even at low levels
+        compression: Optional[int] = None,  # a zipfile.ZIP_* constant; None means ZIP_DEFLATED
+        path: Optional[Union[str, Path]] = None,
+        hash_algo: str = "sha1",  # MediaWiki expects SHA-1; "sha256" or "blake2b" suit dumps that are never imported
     ):
         self.mode = mode
-        self.buffer = io.BytesIO()
+        if hash_algo == "blake2b":
+            # 20-byte digest, so the sha1 fields keep their usual 40 hex characters
+            self._hash = functools.partial(hashlib.blake2b, digest_size=20)
+        else:
+            self._hash = functools.partial(hashlib.new, hash_algo)
+        self._hash(b"")  # unknown algorithm names fail here rather than on the first page
+        self.path = os.fspath(path) if path is not None else None
+        if self.path:
+            self.buffer = open(self.path + ".part", "wb", buffering=1 << 20)
+        else:
+            self.buffer = io.BytesIO()
         self.contributor = contributor
+        self._finalized = False
+        self._ts_second, self._ts = None, ""
 
         if mode == "zip":
             # Standard ZIP archive mode
-            self.zip = zipfile.ZipFile(self.buffer, "w", zipfile.ZIP_DEFLATED)
+            import zipfile
+            if compression is None:
+                compression = zipfile.ZIP_DEFLATED
+            self.zip = zipfile.ZipFile(self.buffer, "w", compression, compresslevel=compresslevel)
         elif mode == "xml":
             # MediaWiki XML export mode
             self._init_xml(site_name, base_url)
         else:
             raise ValueError("ArchiveDocSink mode must be 'zip' or 'xml'")
 
-        self.page_id = 1
-        self.rev_id = 1
+        # Every page carries exactly one revision, so page and revision ids advance together
+        self._page_ids = itertools.count(1)
 
 
     def _init_xml(self, site_name, base_url):
-        self.root = Element(
+        from xml.etree.ElementTree import Element, SubElement, tostring
+
+        # Only the root and siteinfo live as a tree; pages are serialized one at a time
+        root = Element(
             "mediawiki",
             {
                 "xmlns": "http://www.mediawiki.org/xml/export-0.11/",
@@ -1596,11 +2002,11 @@ class ArchiveDocSink(DocSink):
         )
 
         # ── siteinfo header ──
-        siteinfo = SubElement(self.root, "siteinfo")
+        siteinfo = SubElement(root, "siteinfo")
         SubElement(siteinfo, "sitename").text = site_name
         SubElement(siteinfo, "dbname").text = "papyrus_wiki"
         SubElement(siteinfo, "base").text = base_url
-        SubElement(siteinfo, "generator").text = "ReedPapyri 0.1"
+        SubElement(siteinfo, "generator").text = f"ReedPapyri {__version__}"
         SubElement(siteinfo, "case").text = "first-letter"
 
         namespaces = SubElement(siteinfo, "namespaces")
@@ -1617,6 +2023,12 @@ class ArchiveDocSink(DocSink):
                 namespaces, "namespace", {"key": str(key), "case": "first-letter"}
             ).text = name
 
+        # Emit the declaration, the open <mediawiki> tag and siteinfo now; finalize() closes the root
+        header = tostring(root, encoding="unicode")
+        header = header[: -len("</mediawiki>")]
+        self.buffer.write(b"<?xml version='1.0' encoding='utf-8'?>\n")
+        self.buffer.write(header.encode("utf-8"))
+
 
     def write_script(self, script: "PapyrusScript"):
         if self.mode == "zip":
@@ -1647,50 +2059,89 @@ class ArchiveDocSink(DocSink):
 
     def _add_xml_page(self, title, text):
         """Add a fully compliant <page> structure for MediaWiki import."""
-        page = SubElement(self.root, "page")
-        SubElement(page, "title").text = title
-        SubElement(page, "ns").text = "0"
-        SubElement(page, "id").text = str(self.page_id)
-        self.page_id += 1
-
-        revision = SubElement(page, "revision")
-        SubElement(revision, "id").text = str(self.rev_id)
-        self.rev_id += 1
-        SubElement(revision, "timestamp").text = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        contributor = SubElement(revision, "contributor")
-        SubElement(contributor, "username").text = self.contributor
-        SubElement(contributor, "id").text = "1"
-
-        SubElement(revision, "model").text = "wikitext"
-        SubElement(revision, "format").text = "text/x-wiki"
-
-        sha1_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
-        bytes_len = str(len(text.encode("utf-8")))
-
-        text_el = SubElement(
-            revision,
-            "text",
-            {"bytes": bytes_len, "sha1": sha1_hash, "xml:space": "preserve"},
-        )
-        text_el.text = text
-
-        SubElement(revision, "sha1").text = sha1_hash
+        # Every page has the same fixed shape, so it is written from a template instead of
+        # building and serializing an ElementTree per page; the escaping matches tostring().
+        # The body is encoded once and that blob feeds the digest, the length and the output.
+        blob = text.encode("utf-8")
+        sha1_hash = self._hash(blob).hexdigest()
+        # Pages written within the same second share one formatted timestamp
+        now = SOURCE_DATE_EPOCH if SOURCE_DATE_EPOCH is not None else int(time.time())
+        if now != self._ts_second:
+            self._ts_second, self._ts = now, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now))
+        timestamp = self._ts
+        page_id = next(self._page_ids)
+        text_attrs = f' bytes="{len(blob)}" sha1="{sha1_hash}" xml:space="preserve"'
+        write = self.buffer.write
+        write((
+            f"<page>{_xml_leaf('title', title)}<ns>0</ns><id>{page_id}</id>"
+            f"<revision><id>{page_id}</id><timestamp>{timestamp}</timestamp>"
+            f"<contributor>{_xml_leaf('username', self.contributor)}<id>1</id></contributor>"
+            "<model>wikitext</model><format>text/x-wiki</format>"
+        ).encode("utf-8", "xmlcharrefreplace"))
+        if blob:
+            write(f"<text{text_attrs}>".encode("ascii"))
+            write(blob.replace(b"&", b"&amp;").replace(b"<", b"&lt;").replace(b">", b"&gt;"))
+            write(f"</text><sha1>{sha1_hash}</sha1></revision></page>".encode("ascii"))
+        else:
+            write(f"<text{text_attrs} /><sha1>{sha1_hash}</sha1></revision></page>".encode("ascii"))
 
 
     def finalize(self):
+        if self._finalized:
+            return
+        self._finalized = True
         if self.mode == "zip":
             self.zip.close()
         elif self.mode == "xml":
-            tree = ElementTree(self.root)
-            tree.write(self.buffer, encoding="utf-8", xml_declaration=True)
+            self.buffer.write(b"</mediawiki>")
+        if self.path:
+            self.buffer.close()
+            os.replace(self.path + ".part", self.path)
+
+    def discard(self):
+        """Abandon an unfinished archive: release the output and remove its .part file."""
+        if self._finalized:
+            return
+        self._finalized = True
+        if self.mode == "zip":
+            self.zip.close()
+        if self.path:
+            self.buffer.close()
+            with contextlib.suppress(OSError):
+                os.remove(self.path + ".part")
 
     def get_bytes(self) -> bytes:
-        """Return buffer contents (closes and finalizes first)."""
+        """Return archive contents (closes and finalizes first); with `path`, this reads the file back."""
         self.finalize()
+        if self.path:
+            return Path(self.path).read_bytes()
         self.buffer.seek(0)
         return self.buffer.getvalue()
 
+    def write_to(self, dest):
+        """
+        Finalize and write the archive to `dest`, a path or a binary file object, without
+        building a bytes copy of it. Archives streamed to `path` are copied in chunks.
+        """
+        self.finalize()
+        if not isinstance(dest, (str, bytes, os.PathLike)):
+            if self.path:
+                with open(self.path, "rb") as src:
+                    shutil.copyfileobj(src, dest, 1 << 20)
+            else:
+                dest.write(self.buffer.getbuffer())
+            return
+        if self.path:
+            if os.path.abspath(dest) != os.path.abspath(self.path):
+                shutil.copyfile(self.path, dest)
+            return
+        with open(dest, "wb") as f:
+            f.write(self.buffer.getbuffer())
+
+
+
+# Capitalized words in signatures, which may name other scripts
+_REF_WORD = re.compile(r'\b[A-Z][A-Za-z0-9_]+\b')
 
 
 class PapyrusParser:
@@ -1711,25 +2162,72 @@ class PapyrusParser:
     STATE_START = re.compile(r"State\s+(?P<name>\w+)", re.IGNORECASE)
     STATE_END = re.compile(r"EndState", re.IGNORECASE)
     COMMENT_PATTERN = re.compile(r"^\s*;(.+)$")
+    # Every pattern above (struct members aside) needs one of these literals somewhere on the line
+    LINE_KEYWORDS = re.compile(r"scriptname|;|struct|state|property|function|event", re.IGNORECASE)
+
+    # Line breaks str.splitlines() honours beyond \n and \r; real scripts practically never contain them
+    RARE_LINE_BREAKS = "\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
 
     def parse(self, filepath: str) -> PapyrusScript:
-        lines = Path(filepath).read_text(encoding="utf-8").splitlines()
+        return self._parse_text(self._read_text(filepath))
+
+    @classmethod
+    def _read_text(cls, filepath: str) -> str:
+        """Return the file as one \n-separated string, split exactly where splitlines() would split."""
+        text = Path(filepath).read_bytes().decode("utf-8")
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        if any(brk in text for brk in cls.RARE_LINE_BREAKS):
+            return "\n".join(text.splitlines())
+        # splitlines() drops one trailing line break, and the scanner expects none
+        return text[:-1] if text.endswith("\n") else text
+
+    def _iter_lines(self, text: str, in_struct: Callable[[], bool]) -> Iterator[str]:
+        """Yield the lines of `text` that could match a pattern, or every line inside a struct.
+
+        Outside structs the keyword regex scans the whole text and jumps straight to the next
+        candidate line, so plain code and blank lines never reach the per-line patterns.
+        """
+        find_keyword, end, pos = self.LINE_KEYWORDS.search, len(text), 0
+        while pos <= end:
+            if in_struct():
+                nl = text.find("\n", pos)
+                start = pos
+            else:
+                m = find_keyword(text, pos)
+                if not m:
+                    return
+                nl = text.find("\n", m.end())
+                start = text.rfind("\n", pos, m.start()) + 1 or pos
+            if nl < 0:
+                nl = end
+            pos = nl + 1
+            yield text[start:nl]
+
+    def _parse_text(self, text: str) -> PapyrusScript:
         script = None
         current_desc, current_param_docs = [], {}
         in_struct, struct_name, struct_members = False, "", []
         current_state = None
 
-        for line in lines:
-            if m := self.SCRIPT_PATTERN.search(line):
+        for line in self._iter_lines(text, lambda: in_struct):
+            # Each pattern only runs when its keyword is on the line; re.IGNORECASE also lets
+            # a dotless i and a dotted capital I stand in for "i", which casefold() leaves
+            # as "\u0131" and "i\u0307"
+            low = line.casefold()
+            if "\u0131" in low or "\u0307" in low:
+                low = low.replace("i\u0307", "i").replace("\u0131", "i")
+            if "scriptname" in low and (m := self.SCRIPT_PATTERN.search(line)):
                 script_name = m.group("name")  # Use group() to access the matched group
                 extends = m.group("extends") if m.group("extends") else ""  # Use group() and fallback to "" if extends is not found
                 flags = m.group("flags") or ""
                 flags_list = [f.strip().capitalize() for f in flags.split() if f.strip()] # we don't *need* to case normalize
                 script = PapyrusScript(script_name, extends, flags=flags_list)
+                pending_refs = []
                 continue
             if not script:
                 continue
-            if m := self.COMMENT_PATTERN.match(line):
+            if ";" in line and (m := self.COMMENT_PATTERN.match(line)):
                 text = m[1].strip()
                 if text.startswith("@param"):
                     _, pname, *pdesc = text.split(maxsplit=2)
@@ -1738,64 +2236,87 @@ class PapyrusParser:
                     current_desc.append(text)
                 continue
                 
+            stripped = line.strip()
             # Examples?
-            if line.strip().startswith("; Example:"):
+            if stripped.startswith("; Example:"):
                 # Attach example text to the most recently parsed function (if any)
                 if script and script.functions:
                     script.functions[-1].examples.append(
-                        line.strip().lstrip("; ").replace("Example:", "").strip()
+                        stripped.lstrip("; ").replace("Example:", "").strip()
                     )
                 continue
 
             if in_struct:
-                if self.STRUCT_END.search(line):
+                if "struct" in low and self.STRUCT_END.search(line):
                     script.structs.append(PapyrusStruct(struct_name, struct_members, " ".join(current_desc)))
                     in_struct, struct_name, struct_members, current_desc = False, "", [], []
                 else:
-                    if line.strip():
-                        struct_members.append(line.strip())
+                    if stripped:
+                        struct_members.append(stripped)
                 continue
-            if m := self.STRUCT_START.search(line):
+            if "struct" in low and (m := self.STRUCT_START.search(line)):
                 in_struct, struct_name = True, m["name"]
                 continue
-            if self.STATE_START.search(line):
-                current_state = self.STATE_START.search(line)["name"]
+            has_state = "state" in low
+            if has_state and (m := self.STATE_START.search(line)):
+                current_state = m["name"]
                 continue
-            if self.STATE_END.search(line):
+            if has_state and self.STATE_END.search(line):
                 current_state = None
                 continue
-            if m := self.PROP_PATTERN.search(line):
+            if "property" in low and (m := self.PROP_PATTERN.search(line)):
                 script.properties.append(PapyrusProperty(m["name"], m["type"], m["flags"] or "", " ".join(current_desc)))
                 current_desc, current_param_docs = [], {}
                 continue
-            if m := self.FUNC_PATTERN.search(line):
-                script.functions.append(PapyrusFunction(
+            if "function" in low and (m := self.FUNC_PATTERN.search(line)):
+                fn = PapyrusFunction(
                     m["name"], m["ret"], m["params"], m["flags"].strip(),
                     " ".join(current_desc), dict(current_param_docs)
-                ))
+                )
+                script.functions.append(fn)
+                pending_refs.append((fn, _REF_WORD.findall(m["params"] + " " + m["ret"])))
                 current_desc, current_param_docs = [], {}
                 continue
-            if m := self.EVENT_PATTERN.search(line):
+            if "event" in low and (m := self.EVENT_PATTERN.search(line)):
                 ev = PapyrusEvent(
                     m["name"], m["params"], " ".join(current_desc), dict(current_param_docs)
                 )
                 if current_state:
                     ev.state = current_state
                 script.events.append(ev)
+                pending_refs.append((ev, _REF_WORD.findall(m["params"])))
                 current_desc, current_param_docs = [], {}
                 continue
+        if script:
+            self._resolve_references(script, pending_refs)
         return script
 
+    @staticmethod
+    def _signature_words(script: PapyrusScript) -> list:
+        """Pair every function and event on `script` with the capitalized words of its signature."""
+        return ([(fn, _REF_WORD.findall(fn.params + " " + fn.return_type)) for fn in script.functions]
+                + [(ev, _REF_WORD.findall(ev.params)) for ev in script.events])
+
+    @staticmethod
+    def _resolve_references(script: PapyrusScript, pending_refs: list):
+        """Keep the words that may name other scripts, now that every sibling name is known."""
+        known = {f.name for f in script.functions} | {e.name for e in script.events}
+        known.add(script.name)
+        for owner, words in pending_refs:
+            owner.references.update(w for w in words if w not in known)
+
+
+class _PapyrusGrammar(NamedTuple):
+    script_parser: Any
+    parse_exception: type
 
-# pro forma, trips on easy things like comments, namespace colon separators, etc. 
-# intended to eventually handle exotic user scripts (the naive regex one chokes on) and things that are event heavy instead of function heavy
-# i would vastly prefer peggy.js PEG parsing though... 
-class PyParsingPapyrusParser(PapyrusParser):  
 
+@functools.lru_cache(maxsize=1)
+def _papyrus_grammar() -> _PapyrusGrammar:
+    """Build the pyparsing grammar once per process, and only if the pyparsing parser is used."""
     from pyparsing import Word, alphas, alphanums, Literal, Group, delimitedList, ZeroOrMore, ParseException
     from pyparsing import Optional as parsingOptional
 
-
     # Token definitions using pyparsing
     SCRIPT_NAME = Word(alphas)
     EXTENDS_NAME = Word(alphas)
@@ -1834,6 +2355,18 @@ class PyParsingPapyrusParser(PapyrusParser):
     # Main parser: parses the entire script into script components
     SCRIPT_PARSER = Group(SCRIPT_NAME("script_name") + EXTENDS_NAME("extends") + ZeroOrMore(FUNCTION | PROPERTY | EVENT | STRUCT_START | STRUCT_END | STATE_START | STATE_END))
 
+    return _PapyrusGrammar(SCRIPT_PARSER, ParseException)
+
+
+# pro forma, trips on easy things like comments, namespace colon separators, etc. 
+# intended to eventually handle exotic user scripts (the naive regex one chokes on) and things that are event heavy instead of function heavy
+# i would vastly prefer peggy.js PEG parsing though... 
+class PyParsingPapyrusParser(PapyrusParser):  
+
+    def __init__(self):
+        grammar = _papyrus_grammar()
+        self.SCRIPT_PARSER, self.ParseException = grammar.script_parser, grammar.parse_exception
+
     def parse(self, filepath: str) -> 'PapyrusScript':
         lines = Path(filepath).read_text(encoding="utf-8").splitlines()
         script = None
@@ -1905,26 +2438,119 @@ class PyParsingPapyrusParser(PapyrusParser):
                         current_state = parsed.state_name
                         continue
                     
-                except ParseException as e:
+                except self.ParseException as e:
                     print(f"Warning: Failed to parse line {line_number}: {line} - Error: {e}")
                     continue
 
         except Exception as e:
             print(f"Error parsing the script at {filepath}: {e}")
-        
+
+        if script:
+            self._resolve_references(script, self._signature_words(script))
         return script
 
 
 
 
-def generate_docs(input_path: str, output_target, mode: str = "wiki", parser_choice: str = "regular"):
+def iter_files(root: Union[str, Path], suffix: str) -> Iterator[Path]:
     """
-    Generate Papyrus documentation in one of four modes:
-      'wiki' → write .wiki files to an output directory
-      'sql'  → write to a SQLDocSink (keeps connection open for multiple scripts)
-      'zip'  → write to an in-memory zip archive
-      'xml'  → write to a MediaWiki XML dump
+    Yield the files under `root` whose names end in `suffix`, in the order Path.rglob() visits them.
+
+    One os.scandir() pass per directory; DirEntry answers the type checks from the listing
+    itself, so files cost no extra stat. Directory symlinks are not followed, as with rglob().
     """
+    subdirs = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif os.path.normcase(entry.name).endswith(suffix) and entry.is_file():
+                yield Path(entry.path)
+    for subdir in subdirs:
+        yield from iter_files(subdir, suffix)
+
+
+def index_script_parents(psc_files) -> Dict[str, str]:
+    """Record each script's parent from its ScriptName header, for multi-level inheritance chains."""
+    for psc_file in psc_files:
+        with open(psc_file, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                if m := PapyrusParser.SCRIPT_PATTERN.search(line):
+                    if m.group("extends"):
+                        _PARENT_OF[m.group("name")] = m.group("extends")
+                    break
+    return _PARENT_OF
+
+
+# Parsed scripts are pickled here, keyed by path, and reused while the file's
+# mtime and size are unchanged. None disables the cache (--no-parse-cache). Left at the
+# default, it resolves on first use to $XDG_CACHE_HOME/reedpapyri or ~/.cache/reedpapyri.
+_DEFAULT_PARSE_CACHE_DIR = object()
+PARSE_CACHE_DIR: Any = _DEFAULT_PARSE_CACHE_DIR
+# Bump whenever parsing, reference collection or the pickled classes change shape
+PARSE_CACHE_VERSION = 2
+
+
+def _parse_cache_dir() -> Optional[Path]:
+    """Return the parse cache directory, resolving the default on first use; None means disabled."""
+    global PARSE_CACHE_DIR
+    if PARSE_CACHE_DIR is _DEFAULT_PARSE_CACHE_DIR:
+        try:
+            base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+        except (RuntimeError, KeyError):
+            PARSE_CACHE_DIR = None  # no home directory to cache under; the cache is only a speedup
+        else:
+            PARSE_CACHE_DIR = Path(base) / "reedpapyri"
+    return PARSE_CACHE_DIR
+
+
+@functools.lru_cache(maxsize=1)
+def _module_stamp() -> str:
+    # The module's own stamp stands in for the parser version, so an edited or upgraded
+    # reedpapyri never loads pickles written by another one
+    st = os.stat(__file__)
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+def _parse_cache_file(cache_dir: Path, input_path: str, parser_choice: str) -> Path:
+    # Pickles name their classes by module, so entries written by `import reedpapyri` and by
+    # the CLI (__main__) are kept apart
+    key = f"{PARSE_CACHE_VERSION}|{_module_stamp()}|{__name__}|{parser_choice}|{os.path.abspath(input_path)}"
+    return cache_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.pkl"
+
+
+def load_script(input_path: str, parser_choice: str = "regular") -> Optional[PapyrusScript]:
+    """Parse one .psc file (or reuse its cached parse) and collect the references its pages link to."""
+    # The experimental pyparsing parser reports per-line warnings, which a cache hit would hide
+    cache_dir = _parse_cache_dir()
+    if cache_dir is None or parser_choice == "pyparsing":
+        return _load_script_uncached(input_path, parser_choice)
+
+    st = os.stat(input_path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cache_file = _parse_cache_file(cache_dir, input_path, parser_choice)
+    try:
+        with open(cache_file, "rb") as f:
+            cached_stamp, script = pickle.load(f)
+        if cached_stamp == stamp:
+            return script
+    except Exception:
+        pass  # missing, stale-format or unreadable entries are simply rebuilt
+
+    script = _load_script_uncached(input_path, parser_choice)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # Written aside and moved into place, so parallel workers never read half an entry
+        tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump((stamp, script), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+    except (OSError, pickle.PicklingError):
+        pass  # a read-only or full cache directory only costs the speedup
+    return script
+
+
+def _load_script_uncached(input_path: str, parser_choice: str) -> Optional[PapyrusScript]:
     # Choose parser based on user input
     if parser_choice == "pyparsing":
         print(f"Using pyparsing parser...")
@@ -1932,57 +2558,197 @@ def generate_docs(input_path: str, output_target, mode: str = "wiki", parser_cho
     else:
         parser = PapyrusParser()
         
-    script = parser.parse(input_path)
+    # References to other scripts are collected by the parser itself
+    return parser.parse(input_path)
 
-    if script is None:
-        print(f"❌ Failed to parse script: {input_path}")
-        return None
-
-    known_scripts = [f.name for f in script.functions] + [e.name for e in script.events]
 
+def iter_script_pages(script: PapyrusScript, sibling_links: bool = True):
+    """
+    Yield (title, text) for the script page and then every function and event page.
 
+    Per-script state is computed once and shared by all member pages. Sibling links are
+    what wiki mode emits; the sinks render members without them.
+    """
+    yield f"{script.name} Script", script.to_mediawiki()
+    # Pages only list the first three siblings, so build that head once per script
+    fn_siblings = [f.name for f in script.functions[:3]] if sibling_links else []
+    ev_siblings = [e.name for e in script.events[:3]] if sibling_links else []
     for fn in script.functions:
-        for word in re.findall(r'\b[A-Z][A-Za-z0-9_]+\b', fn.params + " " + fn.return_type):
-            if word != script.name and word not in known_scripts:
-                fn.references.add(word)
+        yield f"{fn.name} - {script.name}", fn.to_mediawiki(script.name, fn_siblings)
     for ev in script.events:
-        for word in re.findall(r'\b[A-Z][A-Za-z0-9_]+\b', ev.params):
-            if word != script.name and word not in known_scripts:
-                ev.references.add(word)
+        yield f"{ev.name} - {script.name}", ev.to_mediawiki(script.name, ev_siblings)
+
+
+def _prerender_pages(script: PapyrusScript, mode: str):
+    """Fill each page cache with exactly the arguments `mode` renders with in generate_docs."""
+    for _ in iter_script_pages(script, sibling_links=(mode == "wiki")):
+        pass
+
+
+def _init_render_worker(known_types, parent_of, tags, include_marker, marker_seconds, parse_cache_dir):
+    # Spawned workers start from a fresh import, so replay the CLI's global setup
+    global SYNTAX_TAGS, INCLUDE_GENERATION_MARKER, INCLUDE_MARKER_SECONDS, PARSE_CACHE_DIR
+    KNOWN_TYPES.update(known_types)
+    _finalize_types()
+    _PARENT_OF.update(parent_of)
+    SYNTAX_TAGS = tags
+    INCLUDE_GENERATION_MARKER = include_marker
+    INCLUDE_MARKER_SECONDS = marker_seconds
+    PARSE_CACHE_DIR = parse_cache_dir
+
+
+def _load_and_render(job) -> Optional[PapyrusScript]:
+    input_path, mode, parser_choice = job
+    script = load_script(input_path, parser_choice)
+    if script is not None and mode != "sql":
+        _prerender_pages(script, mode)
+    return script
+
+
+def render_scripts(psc_files, mode: str, parser_choice: str = "regular", workers: Optional[int] = None):
+    """
+    Parse and render `psc_files` across worker processes, yielding (path, script) in input order.
+
+    Scripts come back with their page caches filled, so the sinks' writes in the main
+    process only move finished text. Scripts that fail to parse come back as None.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = [(str(f), mode, parser_choice) for f in psc_files]
+    initargs = (dict(KNOWN_TYPES), dict(_PARENT_OF), SYNTAX_TAGS,
+                INCLUDE_GENERATION_MARKER, INCLUDE_MARKER_SECONDS, _parse_cache_dir())
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker, initargs=initargs) as pool:
+        yield from zip(psc_files, pool.map(_load_and_render, jobs, chunksize=8))
+
+
+# Wiki mode records the pages each script produced here, inside the output directory
+DOCGEN_CACHE_NAME = "docgen.cache.json"
+
+
+class DocgenCache:
+    """
+    Remembers which .psc files a wiki-mode run rendered, so the next run can skip them.
+
+    A script is skipped while its mtime and size, its inheritance chain and the settings
+    its pages render with are all unchanged, and every page it wrote is still on disk.
+    A script that failed to parse is skipped until the file itself changes.
+    Deleting the cache file forces a full rebuild.
+    """
+
+    def __init__(self, output_dir: Union[str, Path], parser_choice: str = "regular"):
+        self.path = Path(output_dir) / DOCGEN_CACHE_NAME
+        self.signature = self._signature(parser_choice)
+        self.entries: Dict[str, dict] = {}
+        self._seen: Dict[str, dict] = {}
+        self._stamps: Dict[str, List[int]] = {}
+        self._existing: Optional[set] = None
+        try:
+            data = json.loads(self.path.read_bytes())
+            if data.get("signature") == self.signature:
+                self.entries = data["files"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass  # missing or unreadable caches just mean a full rebuild
+
+    @staticmethod
+    def _signature(parser_choice: str) -> str:
+        # Everything besides the script itself that changes page text; the module's own
+        # stamp stands in for the renderer version
+        st = os.stat(__file__)
+        key = repr((st.st_mtime_ns, st.st_size, parser_choice, tuple(SYNTAX_TAGS),
+                    INCLUDE_GENERATION_MARKER, INCLUDE_MARKER_SECONDS, sorted(_KNOWN_TYPES.items())))
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def is_fresh(self, psc_file: Union[str, Path]) -> bool:
+        key = os.path.abspath(psc_file)
+        stamp = self._stamps[key] = self._stamp(psc_file)
+        entry = self.entries.get(key)
+        if not entry or entry["stamp"] != stamp:
+            return False
+        if entry.get("failed"):
+            self._seen[key] = entry  # the same bytes would only fail to parse again
+            return True
+        if entry["chain"] != _inheritance_chain(entry["name"], entry["extends"]):
+            return False
+        if self._existing is None:
+            # One listing answers every page check for the run
+            self._existing = {e.name for e in os.scandir(self.path.parent)}
+        if not all(f"{title}.wiki" in self._existing for title in entry["pages"]):
+            return False
+        self._seen[key] = entry
+        return True
+
+    def record(self, psc_file: Union[str, Path], script: Optional[PapyrusScript]):
+        """Remember a rendered script, or with script=None a file that failed to parse."""
+        key = os.path.abspath(psc_file)
+        stamp = self._stamps.get(key) or self._stamp(psc_file)
+        if script is None:
+            self._seen[key] = {"stamp": stamp, "failed": True}
+            return
+        self._seen[key] = {
+            "stamp": stamp,
+            "name": script.name,
+            "extends": script.extends,
+            "chain": _inheritance_chain(script.name, script.extends),
+            # The pages were just rendered, so this walk only reads their caches
+            "pages": [title for title, _ in iter_script_pages(script)],
+        }
+
+    @staticmethod
+    def _stamp(psc_file) -> List[int]:
+        st = os.stat(psc_file)
+        return [st.st_mtime_ns, st.st_size]
+
+    def save(self):
+        """Write the entries for this run's files; files no longer present are dropped."""
+        if self._seen == self.entries:
+            return  # nothing rendered or removed, so the file on disk is already current
+        data = {"signature": self.signature, "files": self._seen}
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not write {self.path}: {e}")
+
+
+def generate_docs(input_path: str, output_target, mode: str = "wiki", parser_choice: str = "regular",
+                  script: Optional[PapyrusScript] = None):
+    """
+    Generate Papyrus documentation in one of four modes:
+      'wiki' → write .wiki files to an output directory
+      'sql'  → write to a SQLDocSink (keeps connection open for multiple scripts)
+      'zip'  → write to an in-memory zip archive
+      'xml'  → write to a MediaWiki XML dump
+
+    Pass an already loaded `script` (see render_scripts) to skip parsing `input_path`.
+    """
+    if script is None:
+        script = load_script(input_path, parser_choice)
+
+    if script is None:
+        print(f"❌ Failed to parse script: {input_path}")
+        return None
 
 
     if mode == "wiki":
         output_dir = Path(output_target)
         os.makedirs(output_dir, exist_ok=True)
-        Path(output_dir, f"{script.name} Script.wiki").write_text(script.to_mediawiki(), encoding="utf-8")
-        for fn in script.functions:
-            Path(output_dir, f"{fn.name} - {script.name}.wiki").write_text(
-                fn.to_mediawiki(script.name, [f.name for f in script.functions]), encoding="utf-8")
-        for ev in script.events:
-            Path(output_dir, f"{ev.name} - {script.name}.wiki").write_text(
-                ev.to_mediawiki(script.name, [e.name for e in script.events]), encoding="utf-8")
+        for title, text in iter_script_pages(script):
+            write_file_bytes(os.path.join(output_dir, f"{title}.wiki"), text.encode("utf-8"))
         print(f"✅ Generated full docs for {script.name} → {output_dir}")
         return None
 
     elif mode == "sql":
         # Keep the same SQLDocSink instance alive for all scripts
         sink = output_target if isinstance(output_target, SQLDocSink) else SQLDocSink(output_target)
-        sink.write_script(script)
-        for fn in script.functions:
-            sink.write_function(script.name, fn)
-        for ev in script.events:
-            sink.write_event(script.name, ev)
+        sink.write_bulk((script,))
         # Do NOT finalize here; let the main caller handle it after all scripts
         print(f"✅ Stored {script.name} in SQL database")
         return sink
 
     elif mode in ("zip", "xml"):
         sink = output_target if isinstance(output_target, ArchiveDocSink) else ArchiveDocSink(mode=mode)
-        sink.write_script(script)
-        for fn in script.functions:
-            sink.write_function(script.name, fn)
-        for ev in script.events:
-            sink.write_event(script.name, ev)
+        sink.write_bulk((script,))
         print(f"✅ Added {script.name} to in-memory {mode.upper()} archive")
         return sink
 
@@ -1993,6 +2759,81 @@ def generate_docs(input_path: str, output_target, mode: str = "wiki", parser_cho
 
 
 
+# Everything below the script list in the Category:Papyrus index; fixed text, so joined once
+_INDEX_FOOTER = "\n".join([
+    "",
+    "=== Additional Categories ===",
+    "* [[:Category:Scripting]]",
+    "* [[:Category:Papyrus]]",
+    "* [[:Category:Events]]",
+    "* [[:Category:Script Objects|All Script Objects]]",
+    "== Adding Custom Types ==",
+    "You can extend this index by supplying a JSON file listing user-defined essential types. Example:",
+    "<syntaxhighlight lang=\"json\">",
+    "[\"MyCustomShip\", \"PlanetObject\", \"DockingPort\"]",
+    "</syntaxhighlight>",
+    "",
+    "== See Also ==",
+    "* [[Papyrus Language Reference]]",
+    "* [[Variables and Properties (Papyrus)|Variables & Properties]]",
+    "* [[Structs (Papyrus)|Structs]]",
+    "* [[Operator Reference|Operators]]",
+    "* [[Event Reference|Events]]",
+    "",
+    # --- Sidebar starts here ---
+    '|style="color:black;" width="30%" border="0" cellpadding="5" valign="top"|',
+    "== Papyrus Index ==",
+    "=== Concepts ===",
+    "* [[Differences_from_Previous_Scripting|Differences from Previous Scripting]]",
+    "* [[Extending Scripts (Papyrus)|Extending Scripts]]",
+    "* [[Persistence (Papyrus)|Persistence]]",
+    "",
+    "=== Language ===",
+    "* [[Operator_Reference|Operators]]",
+    "* [[Expression_Reference|Expressions]]",
+    "* [[Statement_Reference|Statements]]",
+    "* [[Function_Reference|Functions]]",
+    "* [[States (Papyrus)|States]]",
+    "",
+    "=== Types ===",
+    "* [[:Category:Script Objects|Objects]]",
+    "* [[Variables and Properties (Papyrus)|Variables & Properties]]",
+    "* [[Arrays (Papyrus)|Arrays]]",
+    "* [[Structs (Papyrus)|Structs]]",
+    "",
+    "=== Events ===",
+    "* [[:Category:Events|Events]]",
+    "* [[Remote Papyrus Event Registration|Remote Event Registrations]]",
+    "* [[Custom Papyrus Events|Custom Events]]",
+    "",
+    "=== External Text Editors ===",
+    "* [[:Category:Text Editors|Choosing a Text Editor]]",
+    "* [[Visual Studio Code]]",
+    "",
+    "=== Compiler ===",
+    "* [[Papyrus Compiler Reference|Compiler Reference]]",
+    "* [[Papyrus Compiler Errors|Papyrus Compiler Errors]]",
+    "* [[:Category:Papyrus Configurations|Papyrus Configurations]]",
+    "* [[Papyrus Projects]]",
+    "",
+    "=== Reference Pages ===",
+    "* [[Papyrus FAQs]]",
+    "* [[:Category:Papyrus Language Reference|Papyrus Language Reference]]",
+    "* [[Papyrus Runtime Errors]]",
+    "* [[INI Settings (Papyrus)|Papyrus-related INI Settings]]",
+    "* [[Game Settings (Papyrus)|Papyrus-Related Game Settings]]",
+    "* [[Console Commands (Papyrus)|Papyrus-Related Console Commands]]",
+    "* [[Papyrus_Glossary|Glossary of Terms]]",
+    "|-",
+    "|colspan=2|",
+    "|}",
+    "",
+    "[[Category:Scripting]]",
+    "[[Category:Papyrus]]",
+    "[[Category:Script Objects]]",
+])
+
+
 def generate_index(
     directory: str,
     user_type_file: Optional[str] = None,
@@ -2005,10 +2846,13 @@ def generate_index(
     Otherwise, it writes a Category:Papyrus.wiki file in the given directory.
     """
     merge_user_types(user_type_file)
-    scripts = sorted({Path(p).stem for p in Path(directory).rglob("*.psc")})
+    scripts = sorted({p.stem for p in iter_files(directory, ".psc")})
+
+    buf = io.StringIO()
+    w = buf.write
 
     # Begin wiki table layout
-    out_lines = [
+    w("\n".join([
         "__NOTOC__ __NOEDITSECTION__",
         "",
         '{|style="color:black;" width="100%" border="0" cellpadding="5" valign="top"',
@@ -2022,89 +2866,19 @@ def generate_index(
         "This page provides a concise, automatically generated listing of all Papyrus script reference pages in this documentation set.",
         "",
         "=== Script Objects ===",
-    ]
+    ]))
 
     # Add all script pages
     for s in scripts:
-        out_lines.append(f"* [[{s} Script]]")
+        w(f"\n* [[{s} Script]]")
 
     # Additional categories below the script list
-    out_lines += [
-        "",
-        "=== Additional Categories ===",
-        "* [[:Category:Scripting]]",
-        "* [[:Category:Papyrus]]",
-        "* [[:Category:Events]]",
-        "* [[:Category:Script Objects|All Script Objects]]",
-        "== Adding Custom Types ==",
-        "You can extend this index by supplying a JSON file listing user-defined essential types. Example:",
-        "<syntaxhighlight lang=\"json\">",
-        "[\"MyCustomShip\", \"PlanetObject\", \"DockingPort\"]",
-        "</syntaxhighlight>",
-        "",
-        "== See Also ==",
-        "* [[Papyrus Language Reference]]",
-        "* [[Variables and Properties (Papyrus)|Variables & Properties]]",
-        "* [[Structs (Papyrus)|Structs]]",
-        "* [[Operator Reference|Operators]]",
-        "* [[Event Reference|Events]]",
-        "",
-        # --- Sidebar starts here ---
-        '|style="color:black;" width="30%" border="0" cellpadding="5" valign="top"|',
-        "== Papyrus Index ==",
-        "=== Concepts ===",
-        "* [[Differences_from_Previous_Scripting|Differences from Previous Scripting]]",
-        "* [[Extending Scripts (Papyrus)|Extending Scripts]]",
-        "* [[Persistence (Papyrus)|Persistence]]",
-        "",
-        "=== Language ===",
-        "* [[Operator_Reference|Operators]]",
-        "* [[Expression_Reference|Expressions]]",
-        "* [[Statement_Reference|Statements]]",
-        "* [[Function_Reference|Functions]]",
-        "* [[States (Papyrus)|States]]",
-        "",
-        "=== Types ===",
-        "* [[:Category:Script Objects|Objects]]",
-        "* [[Variables and Properties (Papyrus)|Variables & Properties]]",
-        "* [[Arrays (Papyrus)|Arrays]]",
-        "* [[Structs (Papyrus)|Structs]]",
-        "",
-        "=== Events ===",
-        "* [[:Category:Events|Events]]",
-        "* [[Remote Papyrus Event Registration|Remote Event Registrations]]",
-        "* [[Custom Papyrus Events|Custom Events]]",
-        "",
-        "=== External Text Editors ===",
-        "* [[:Category:Text Editors|Choosing a Text Editor]]",
-        "* [[Visual Studio Code]]",
-        "",
-        "=== Compiler ===",
-        "* [[Papyrus Compiler Reference|Compiler Reference]]",
-        "* [[Papyrus Compiler Errors|Papyrus Compiler Errors]]",
-        "* [[:Category:Papyrus Configurations|Papyrus Configurations]]",
-        "* [[Papyrus Projects]]",
-        "",
-        "=== Reference Pages ===",
-        "* [[Papyrus FAQs]]",
-        "* [[:Category:Papyrus Language Reference|Papyrus Language Reference]]",
-        "* [[Papyrus Runtime Errors]]",
-        "* [[INI Settings (Papyrus)|Papyrus-related INI Settings]]",
-        "* [[Game Settings (Papyrus)|Papyrus-Related Game Settings]]",
-        "* [[Console Commands (Papyrus)|Papyrus-Related Console Commands]]",
-        "* [[Papyrus_Glossary|Glossary of Terms]]",
-        "|-",
-        "|colspan=2|",
-        "|}",
-        "",
-        "[[Category:Scripting]]",
-        "[[Category:Papyrus]]",
-        "[[Category:Script Objects]]",
-    ]
+    w("\n")
+    w(_INDEX_FOOTER)
 
     # Final content
     index_title = "Category:Papyrus"
-    index_text = "\n".join(out_lines)
+    index_text = buf.getvalue()
 
     # Write into sink if available, otherwise to filesystem
     if sink:
@@ -2150,9 +2924,16 @@ class PapyrusForeignDecompilerAutomation:
         self.base_dir = Path(base_dir or os.getcwd()).resolve()
         self.env = self._make_safe_env(env)
         self.runner_hint = runner_hint
+        import platform
         self.is_windows = platform.system().lower().startswith("win")
         self.sandbox = sandbox
         self.runner = self._detect_runner()
+        # Fixed for the whole run, so resolved once instead of per .pex file
+        self._exe_str = str(self.decompiler_path)
+        self._sandbox_prefix = (
+            ["firejail", "--quiet", f"--private={self.base_dir}"]
+            if sandbox and shutil.which("firejail") else []
+        )
 
         if not self.decompiler_path.exists():
             raise FileNotFoundError(f"Decompiler not found: {self.decompiler_path}")
@@ -2173,6 +2954,9 @@ class PapyrusForeignDecompilerAutomation:
             safe_env.update(user_env)
         return safe_env
 
+    # Leading bytes of ELF binaries, Mach-O binaries and #! scripts; anything else (a PE "MZ" image) gets a runner
+    NATIVE_MAGIC = (b"\x7fELF", b"\xcf\xfa\xed\xfe", b"\xce\xfa\xed\xfe", b"\xca\xfe\xba\xbe", b"#!")
+
     def _detect_runner(self) -> Optional[List[str]]:
         """Detect execution environment (native, wine, proton, bottles)."""
         if self.is_windows:
@@ -2185,6 +2969,16 @@ class PapyrusForeignDecompilerAutomation:
                 return parts
             raise RuntimeError(f"Runner '{self.runner_hint}' not found in PATH.")
 
+        # a native executable or script needs no Windows runner
+        try:
+            with open(self.decompiler_path, "rb") as f:
+                magic = f.read(4)
+        except OSError:
+            magic = b""  # a missing decompiler is reported by __init__
+        if magic.startswith(self.NATIVE_MAGIC):
+            print("🔧 Decompiler is a native executable; running it directly")
+            return None
+
         # auto-detect
         for candidate in ("wine64", "wine", "bottles-cli", "proton"):
             if shutil.which(candidate):
@@ -2204,13 +2998,16 @@ class PapyrusForeignDecompilerAutomation:
     def _should_skip(self, pex: Path, psc: Path) -> bool:
         if self.force:
             return False
-        return psc.exists() and psc.stat().st_mtime > pex.stat().st_mtime
+        try:
+            return psc.stat().st_mtime > pex.stat().st_mtime
+        except FileNotFoundError:
+            return False
 
     # ---------------------------------------------------------------------- #
     #  Command builder
     # ---------------------------------------------------------------------- #
     def _build_command(self, pex: Path) -> List[str]:
-        exe = str(self.decompiler_path)
+        exe = self._exe_str
         args = [exe, str(pex)]
 
         if not self.runner:
@@ -2220,6 +3017,7 @@ class PapyrusForeignDecompilerAutomation:
 
         if runner == "proton":
             # Proton needs "proton run ..."
+            import tempfile
             compat_dir = os.path.join(tempfile.gettempdir(), "proton-sandbox")
             os.makedirs(compat_dir, exist_ok=True)
             self.env.setdefault("STEAM_COMPAT_DATA_PATH", compat_dir)
@@ -2245,19 +3043,17 @@ class PapyrusForeignDecompilerAutomation:
 
         print(f"🧩 Decompiling {pex.name}...")
 
-        cmd = self._build_command(pex)
-
         # firejail sandbox if available
-        if self.sandbox and shutil.which("firejail"):
-            cmd = ["firejail", "--quiet", "--private=" + str(self.base_dir)] + cmd
+        cmd = self._sandbox_prefix + self._build_command(pex)
 
         temp_psc = expected_psc.with_suffix(".psc.tmp")
 
+        import subprocess
         try:
+            # Output is kept as bytes and only decoded when there is an error to report
             result = subprocess.run(
                 cmd,
                 capture_output=True,
-                text=True,
                 env=self.env,
                 timeout=self.timeout,
                 check=False,
@@ -2271,8 +3067,8 @@ class PapyrusForeignDecompilerAutomation:
             return None
 
         if result.returncode != 0:
-            stderr = (result.stderr or "").strip()
-            stdout = (result.stdout or "").strip()
+            stderr = (result.stderr or b"").decode("utf-8", "replace").strip()
+            stdout = (result.stdout or b"").decode("utf-8", "replace").strip()
             print(f"⚠️ Decompiler error ({pex.name}): {stderr or stdout}")
             return None
 
@@ -2295,35 +3091,95 @@ class PapyrusForeignDecompilerAutomation:
         root = Path(directory).resolve()
         if not self._within_base_dir(root):
             raise PermissionError(f"{root} is outside base dir {self.base_dir}")
-        return sorted(root.rglob("*.pex"))
+        # Same order as sorting the Paths themselves (component by component, case-normalised
+        # on Windows), but as plain strings: NUL sorts below every character a name can contain
+        return sorted(iter_files(root, ".pex"), key=lambda p: os.path.normcase(p).replace(os.sep, "\0"))
 
-    def run(self, directory: str) -> List[Path]:
+    def run(self, directory: str, jobs: int = 1) -> List[Path]:
         print(f"🔍 Searching for .pex files under {directory}")
         pex_files = self.find_pex_files(directory)
         if not pex_files:
             print("ℹ️ No .pex files found.")
             return []
 
-        generated = []
-        for pex in pex_files:
-            psc = self._decompile_one(pex)
-            if psc:
-                generated.append(psc)
+        if jobs > 1:
+            # Each decompile is its own subprocess, so threads are enough to run them side by side
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(self._decompile_one, pex_files))
+        else:
+            results = [self._decompile_one(pex) for pex in pex_files]
+        generated = [psc for psc in results if psc]
 
         print(f"✅ Decompilation complete. {len(generated)} .psc files ready.")
         return generated
 
 
 
+# Fixed CLI notices, each written in one call
+_SECURITY_NOTICE = textwrap.dedent("""
+    ⚠️  SECURITY NOTICE:
+    This operation may help set up Docker containers and related code for:
+      - MediaWiki (MediaWiki base image)
+      - Caddy (reverse proxy and SSL automation)
+      - pygmentize (syntax highlighting binary)
+
+    These components are downloaded from external sources and may execute third-party code.
+    They could be subject to supply chain vulnerabilities or version changes.
+    Only proceed if you trust the sources and have reviewed the Dockerfiles or images.
+
+""")
+
+_DOCKER_USAGE_NOTE = textwrap.dedent("""\
+    🧩  Docker usage note:
+       - To start the environment in the foreground (recommended for first run):
+           docker compose up
+       - To detach and run in the background (optional):
+           docker compose up -d
+
+    💣  If you wish to completely reset your MediaWiki installation state
+        and destroy all volume data, use:
+           docker compose down -v
+        (This will wipe all wiki content, users, and the MariaDB volume.)
+
+""")
+
+
+def _parse_env_pairs(items) -> Dict[str, str]:
+    """Turn VAR=VALUE strings into a dict; malformed items are reported and skipped."""
+    env = {}
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep or not key:
+            print(f"⚠️ Ignoring malformed environment variable (expected VAR=VALUE): {item}")
+            continue
+        env[key] = value
+    return env
+
+
+def _fatal(message: str):
+    """Print the exception being handled, then exit with `message` on stderr (status 1)."""
+    # Only failures pay for importing traceback
+    import traceback
+
+    traceback.print_exc()
+    sys.exit(message)
+
+
 if __name__ == "__main__":
+    # Answered before the banner and before the parser below is built
+    if sys.argv[1:] in (["-V"], ["--version"]):
+        print(f"ReedPapyri {__version__}")
+        sys.exit(0)
+
     import argparse
-    import traceback
  
     print("🔧 ReedPapyri — Papyrus Documentation & Wiki Toolchain")
 
     ap = argparse.ArgumentParser(
         description="Papyrus docgen / auto-linking MediaWiki toolchain for BGS games or their mods (supports wiki, sql, zip, and xml outputs)"
     )
+    ap.add_argument("-V", "--version", action="version", version=f"ReedPapyri {__version__}")
 
     ap.add_argument(
         "psc_or_dir",
@@ -2340,6 +3196,18 @@ if __name__ == "__main__":
         default="wiki",
         help="Output mode: wiki, sql, zip, or xml",
     )
+    ap.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for parsing and rendering a directory of scripts, and for .pex decompilation "
+             "(default: 1; 0 uses every CPU).",
+    )
+    ap.add_argument(
+        "--no-parse-cache",
+        action="store_true",
+        help="Always reparse scripts instead of reusing cached parses of unchanged files",
+    )
     ap.add_argument("--db-conn", help="SQL connection string or path (required if mode=sql)")
     ap.add_argument("--db-dialect", choices=["sqlite", "postgres"], default="sqlite",
                     help="Database dialect for SQL mode")
@@ -2445,9 +3313,10 @@ if __name__ == "__main__":
         help="Host port to expose the MariaDB service (default: 30433)."
     )
 
-    ap.add_argument("--sqlsink-enable-batch", action="store_true", help="Enable batch write mode.")
+    ap.add_argument("--sqlsink-enable-batch", action="store_true", default=True, help="Enable batch write mode (default).")
+    ap.add_argument("--sqlsink-disable-batch", dest="sqlsink_enable_batch", action="store_false", help="Insert and commit one row at a time.")
     ap.add_argument("--sqlsink-batch-id", type=str, help="Logical batch ID for this run.")
-    ap.add_argument("--sqlsink-batch-size", type=int, default=500, help="Flush size for batched writes.")
+    ap.add_argument("--sqlsink-batch-size", type=int, default=5000, help="Flush size for batched writes.")
 
     ap.add_argument(
         "--docker-wikilogo",
@@ -2480,6 +3349,14 @@ if __name__ == "__main__":
         INCLUDE_MARKER_SECONDS = False
         print("ℹ️ Generation marker timestamps limited to minutes precision.")
 
+    if args.no_parse_cache:
+        PARSE_CACHE_DIR = None
+
+    if args.jobs < 0:
+        ap.error(f"--jobs must be 0 or a positive number, not {args.jobs}")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+
     input_path = Path(args.psc_or_dir)
     output_dir = Path(args.out)
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -2508,6 +3385,18 @@ if __name__ == "__main__":
             )
 
 
+    # Archive modes stream straight into their final file, so name it up front
+    archive_name = 'PapyrusRef'
+    if args.mode in ("xml", "zip"):
+        # Force the name to be PapyrusDocs.xml for Docker
+        if args.docker:
+            archive_name = "PapyrusDocs.xml"  # Fix the name for Docker usage
+        else:
+            # Keep timestamped name for non-Docker cases
+            archive_name = f"{args.project_name}_{time.strftime('%Y%m%d_%H%M%S')}.{args.mode}"
+
+        output_file = output_dir / archive_name  # Define the output path
+
     sink = None
     try:
         if args.mode == "xml":
@@ -2516,9 +3405,10 @@ if __name__ == "__main__":
                 site_name=args.project_name,
                 base_url=args.wiki_base,
                 contributor=args.wiki_user,
+                path=output_file,
             )
         elif args.mode == "zip":
-            sink = ArchiveDocSink(mode="zip")
+            sink = ArchiveDocSink(mode="zip", path=output_file)
         elif args.mode == "sql":
             # Initialize the SQL sink with batching options from CLI.
             # Note: when batching is enabled we disable autocommit for efficiency.
@@ -2543,85 +3433,96 @@ if __name__ == "__main__":
                     pass
                 sys.exit(f"❌ Database connection test failed: {type(e).__name__}: {e}")
     except Exception as e:
-        traceback.print_exc()
-        sys.exit(f"❌ Failed to initialize output sink: {e}")
-        
-    if args.preproc_foreign_decompiler:
-        print("⚙️ Running foreign decompiler preprocessor...")
-        env = dict(e.split("=", 1) for e in args.foreign_decompiler_env) if args.foreign_decompiler_env else None
-        PapyrusForeignDecompilerAutomation(
-            decompiler_path=args.foreign_decompiler_path,
-            force=args.foreign_decompiler_force_decompile,
-            runner_hint=args.foreign_decompiler_runner,
-            env=env,
-        ).run(str(input_path))
-
-    total_scripts = 0
-    try:
-        if input_path.is_file():
-            print(f"📄 Parsing single file: {input_path.name}")
-            generate_docs(str(input_path), sink or args.out, args.mode, parser_choice)
-            total_scripts = 1
-        else:
-            print(f"📂 Scanning directory: {input_path}")
-            psc_files = list(input_path.rglob("*.psc"))
-            if not psc_files:
-                print("⚠️ No .psc files found.")
-            for psc_file in psc_files:
-                print(f"📄 Parsing {psc_file}")
-                generate_docs(str(psc_file), sink or args.out, args.mode, parser_choice)
-                total_scripts += 1
-    except Exception as e:
-        print(f"❌ Error while generating docs: {e}")
-        traceback.print_exc()
-        sys.exit(1)
+        _fatal(f"❌ Failed to initialize output sink: {e}")
         
-    if args.index:
+    # Every way out of this block, including _fatal(), releases the sink exactly once.
+    # Archives that never reach finalize() are dropped rather than published half-written;
+    # the SQL sink commits what was stored so far.
+    with contextlib.ExitStack() as sink_cleanup:
+        if isinstance(sink, ArchiveDocSink):
+            sink_cleanup.callback(sink.discard)
+        elif isinstance(sink, SQLDocSink):
+            sink_cleanup.callback(sink.finalize)
+        if args.preproc_foreign_decompiler:
+            print("⚙️ Running foreign decompiler preprocessor...")
+            env = _parse_env_pairs(args.foreign_decompiler_env) if args.foreign_decompiler_env else None
+            PapyrusForeignDecompilerAutomation(
+                decompiler_path=args.foreign_decompiler_path,
+                force=args.foreign_decompiler_force_decompile,
+                runner_hint=args.foreign_decompiler_runner,
+                env=env,
+            ).run(str(input_path), jobs=args.jobs)
+
+        total_scripts = skipped_scripts = 0
         try:
-            generate_index(
-                args.out,
-                args.user_types,
-                args.project_name,
-                sink=sink if sink else None,
-            )
+            if input_path.is_file():
+                print(f"📄 Parsing single file: {input_path.name}")
+                generate_docs(str(input_path), sink or args.out, args.mode, parser_choice)
+                total_scripts = 1
+            else:
+                print(f"📂 Scanning directory: {input_path}")
+                psc_files = list(iter_files(input_path, ".psc"))
+                if not psc_files:
+                    print("⚠️ No .psc files found.")
+                # Headers only, so every page can show its full inheritance chain
+                index_script_parents(psc_files)
+                # Archives and databases are rebuilt whole; only loose .wiki pages survive between runs
+                docgen_cache = DocgenCache(output_dir, parser_choice) if args.mode == "wiki" else None
+                if docgen_cache:
+                    stale = [f for f in psc_files if not docgen_cache.is_fresh(f)]
+                    skipped_scripts = len(psc_files) - len(stale)
+                    if skipped_scripts:
+                        print(f"⏭️ Skipping {skipped_scripts} unchanged scripts ({DOCGEN_CACHE_NAME})")
+                    psc_files = stale
+                if args.jobs > 1 and len(psc_files) > 1:
+                    # Workers parse and render; this process only writes, in the original file order
+                    scripts = render_scripts(psc_files, args.mode, parser_choice, args.jobs)
+                else:
+                    scripts = ((f, None) for f in psc_files)
+                for psc_file, script in scripts:
+                    print(f"📄 Parsing {psc_file}")
+                    total_scripts += 1
+                    if script is None:
+                        script = load_script(str(psc_file), parser_choice)
+                    if script is None:
+                        print(f"❌ Failed to parse script: {psc_file}")
+                        if docgen_cache:
+                            docgen_cache.record(psc_file, None)
+                        continue
+                    generate_docs(str(psc_file), sink or args.out, args.mode, parser_choice, script=script)
+                    if docgen_cache:
+                        docgen_cache.record(psc_file, script)
+                if docgen_cache:
+                    docgen_cache.save()
         except Exception as e:
-            print(f"⚠️ Failed to generate index: {e}")
-
-
-    # This section writes the output based on the sink type (XML, SQL, etc.)
-    archive_name = 'PapyrusRef'
-    if isinstance(sink, ArchiveDocSink):
-        # Force the name to be PapyrusDocs.xml for Docker
-        if args.docker:
-            archive_name = "PapyrusDocs.xml"  # Fix the name for Docker usage
-        else:
-            # Keep timestamped name for non-Docker cases
-            archive_name = f"{args.project_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{args.mode}"
-        
-        output_file = output_dir / archive_name  # Define the output path
+            _fatal(f"❌ Error while generating docs: {e}")
         
-        with open(output_file, "wb") as f:
-            f.write(sink.get_bytes())  # Write the bytes to the file
-        print(f"📦 Wrote {args.mode.upper()} archive → {output_file}")
+        if args.index:
+            try:
+                generate_index(
+                    args.out,
+                    args.user_types,
+                    args.project_name,
+                    sink=sink if sink else None,
+                )
+            except Exception as e:
+                print(f"⚠️ Failed to generate index: {e}")
 
-    elif isinstance(sink, SQLDocSink):
-        try:
+
+        # This section writes the output based on the sink type (XML, SQL, etc.)
+        if isinstance(sink, ArchiveDocSink):
             sink.finalize()
-            print(f"💾 Saved SQL database → {getattr(sink.conn, 'database', args.db_conn)}")
-        except Exception as e:
-            print(f"⚠️ Failed to finalize SQL sink: {e}")
+            print(f"📦 Wrote {args.mode.upper()} archive → {output_file}")
+
+        elif isinstance(sink, SQLDocSink):
+            try:
+                sink.finalize()
+                print(f"💾 Saved SQL database → {getattr(sink.conn, 'database', args.db_conn)}")
+            except Exception as e:
+                print(f"⚠️ Failed to finalize SQL sink: {e}")
 
     if args.docker:
-        print("\n⚠️  SECURITY NOTICE:")
-        print("This operation may help set up Docker containers and related code for:")
-        print("  - MediaWiki (MediaWiki base image)")
-        print("  - Caddy (reverse proxy and SSL automation)")
-        print("  - pygmentize (syntax highlighting binary)")
-        print("")
-        print("These components are downloaded from external sources and may execute third-party code.")
-        print("They could be subject to supply chain vulnerabilities or version changes.")
-        print("Only proceed if you trust the sources and have reviewed the Dockerfiles or images.")
-        print("")
+        sys.stdout.write(_SECURITY_NOTICE)
 
         confirm = input("Type 'yes' to continue, or anything else to cancel: ").strip().lower()
         if confirm != "yes":
@@ -2650,11 +3551,8 @@ if __name__ == "__main__":
 
                 # Handle port randomization or overrides
                 if args.dockerport_randomize:
-                    import random
-                    # Add a random offset in a reasonable range (so they don’t collide)
-                    offset = random.randint(0, 499)
-                    mw_port = args.dockerport_portmw + offset
-                    db_port = args.dockerport_portdb + offset
+                    # Same random offset for both, skipping offsets where either port is already taken
+                    mw_port, db_port = _pick_free_port_pair(args.dockerport_portmw, args.dockerport_portdb)
                     print(f"🎲 Randomizing Docker ports → MediaWiki:{mw_port}  MariaDB:{db_port}")
                 else:
                     mw_port = args.dockerport_portmw
@@ -2725,14 +3623,23 @@ if __name__ == "__main__":
 
                         if args.docker_wikilogo and Path(args.docker_wikilogo).is_file():
                             try:
-                                with open(args.docker_wikilogo, "rb") as f:
-                                    magic = f.read(8)
-                                if magic == b"\x89PNG\r\n\x1a\n":
-                                    shutil.copy2(args.docker_wikilogo, wiki_png_path)
-                                    print(f"🖼️ Copied custom wiki logo → {wiki_png_path}")
+                                # copy2 keeps the mtime, so a matching size and mtime means an earlier run already copied it
+                                src_st = os.stat(args.docker_wikilogo)
+                                try:
+                                    dst_st = os.stat(wiki_png_path)
+                                except FileNotFoundError:
+                                    dst_st = None
+                                if dst_st and (src_st.st_mtime_ns, src_st.st_size) == (dst_st.st_mtime_ns, dst_st.st_size):
+                                    print(f"✔ Custom wiki logo already up to date at {wiki_png_path}")
                                 else:
-                                    print(f"⚠️ Custom logo '{args.docker_wikilogo}' is not a valid PNG (magic mismatch). Generating dummy logo instead.")
-                                    ensure_dummy_png(wiki_png_path, color=(255, 255, 255, 255), size=(160, 160))
+                                    with open(args.docker_wikilogo, "rb") as f:
+                                        magic = f.read(8)
+                                    if magic == b"\x89PNG\r\n\x1a\n":
+                                        shutil.copy2(args.docker_wikilogo, wiki_png_path)
+                                        print(f"🖼️ Copied custom wiki logo → {wiki_png_path}")
+                                    else:
+                                        print(f"⚠️ Custom logo '{args.docker_wikilogo}' is not a valid PNG (magic mismatch). Generating dummy logo instead.")
+                                        ensure_dummy_png(wiki_png_path, color=(255, 255, 255, 255), size=(160, 160))
                             except Exception as e:
                                 print(f"⚠️ Failed to verify logo file: {e}. Generating dummy logo instead.")
                                 ensure_dummy_png(wiki_png_path, color=(255, 255, 255, 255), size=(160, 160))
@@ -2752,17 +3659,7 @@ if __name__ == "__main__":
 
 
                 # --- User guidance about Docker usage --------------------------------
-                print("🧩  Docker usage note:")
-                print("   - To start the environment in the foreground (recommended for first run):")
-                print("       docker compose up")
-                print("   - To detach and run in the background (optional):")
-                print("       docker compose up -d")
-                print("")
-                print("💣  If you wish to completely reset your MediaWiki installation state")
-                print("    and destroy all volume data, use:")
-                print("       docker compose down -v")
-                print("    (This will wipe all wiki content, users, and the MariaDB volume.)")
-                print("")
+                sys.stdout.write(_DOCKER_USAGE_NOTE)
 
 
 
@@ -2770,7 +3667,8 @@ if __name__ == "__main__":
                 print(f"⚠️ Docker generation failed: {e}")
 
 
-    print(f"✅ Completed: {total_scripts} Papyrus scripts processed in mode '{args.mode}'.")
+    skipped_note = f" ({skipped_scripts} unchanged skipped)" if skipped_scripts else ""
+    print(f"✅ Completed: {total_scripts} Papyrus scripts processed in mode '{args.mode}'{skipped_note}.")
     print("🎆 Done.")
 
 